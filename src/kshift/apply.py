@@ -0,0 +1,121 @@
+import subprocess
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Union
+
+from pydantic import BaseModel
+
+# Seconds a single Plasma tool or user command may run before it is killed
+ATTRIBUTE_TIMEOUT = 30
+COMMAND_TIMEOUT = 60
+
+
+class Step(BaseModel):
+    """A command to run while applying a theme."""
+    name: str
+
+    # An argument list, or a string run through the shell
+    args: Union[List[str], str]
+
+    # Names of steps that must finish before this one starts
+    after: List[str] = []
+    timeout: float = ATTRIBUTE_TIMEOUT
+
+
+class StepResult(BaseModel):
+    name: str
+    ok: bool
+    duration: float
+    returncode: Optional[int] = None
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        status = "ok" if self.ok else f"failed: {self.error}"
+        return f"{self.name}: {status} ({self.duration:.2f}s)"
+
+
+class Change(BaseModel):
+    """Whether a theme attribute is applied, and why."""
+    name: str
+    value: str
+    apply: bool
+    reason: str
+
+    def __str__(self) -> str:
+        action = "apply" if self.apply else "skip"
+        return f"{action:<5} {self.name} {self.value} ({self.reason})"
+
+
+class Plan(BaseModel):
+    """The changes a theme makes to the desktop and the steps making them."""
+    changes: List[Change] = []
+    steps: List[Step] = []
+
+    def add(self, step: Step, value: str, reason: str):
+        self.steps.append(step)
+        self.changes.append(
+            Change(name=step.name, value=value, apply=True, reason=reason))
+
+    def skip(self, name: str, value: str, reason: str):
+        self.changes.append(
+            Change(name=name, value=value, apply=False, reason=reason))
+
+    def __str__(self) -> str:
+        return "\n".join(str(change) for change in self.changes)
+
+
+def run_step(step: Step) -> StepResult:
+    start = time.monotonic()
+
+    def result(**kwargs) -> StepResult:
+        return StepResult(name=step.name,
+                          duration=time.monotonic() - start,
+                          **kwargs)
+
+    try:
+        process = subprocess.run(step.args,
+                                 shell=isinstance(step.args, str),
+                                 timeout=step.timeout)
+    except subprocess.TimeoutExpired:
+        return result(ok=False, error=f"timed out after {step.timeout}s")
+    except OSError as e:
+        return result(ok=False, error=str(e))
+
+    return result(ok=process.returncode == 0,
+                  returncode=process.returncode,
+                  error=None if process.returncode == 0 else
+                  f"exited with status {process.returncode}")
+
+
+def run_steps(steps: List[Step]) -> List[StepResult]:
+    """Run steps concurrently, each once the steps it comes after finished.
+
+    Ordering only, a step still runs if one it comes after failed. Results are
+    returned in the order the steps were given.
+    """
+    names = {step.name for step in steps}
+    pending = list(steps)
+    results = {}
+
+    if not steps:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        running = {}
+
+        while pending or running:
+            for step in list(pending):
+                if all(dep in results for dep in step.after if dep in names):
+                    running[pool.submit(run_step, step)] = step.name
+                    pending.remove(step)
+
+            if not running:
+                raise ValueError(
+                    f"Circular step order: {[s.name for s in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return [results[step.name] for step in steps]
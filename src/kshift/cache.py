@@ -0,0 +1,163 @@
+import functools
+import json
+import os
+import threading
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from kshift import oncalendar
+from kshift.utils import atomic_write, normalize_calendars, xdg_cache_home
+
+CACHE_VERSION = 1
+
+# Inventories may be stored concurrently during discovery
+_lock = threading.Lock()
+
+
+def cache_dir() -> Path:
+    return xdg_cache_home() / "kshift"
+
+
+def inventory_file() -> Path:
+    return cache_dir() / "inventory.json"
+
+
+def calendar_file() -> Path:
+    return cache_dir() / "calendar.json"
+
+
+def fingerprint(sources: List[Path]) -> Dict[str, Optional[int]]:
+    """Map each source path to its mtime, or None if it does not exist."""
+    stamps = {}
+    for source in sources:
+        try:
+            stamps[str(source)] = os.stat(source).st_mtime_ns
+        except OSError:
+            stamps[str(source)] = None
+
+    return stamps
+
+
+def _read_cache() -> dict:
+    try:
+        with open(inventory_file(), "r") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+
+    return data
+
+
+def load_inventory(
+    name: str,
+    stamps: Dict[str,
+                 Optional[int]]) -> Optional[Tuple[List[str], Optional[str]]]:
+    """Return a cached inventory if none of its sources have changed."""
+    entry = _read_cache().get("inventories", {}).get(name)
+
+    if entry and entry.get("sources") == stamps:
+        return entry["available"], entry["current"]
+
+    return None
+
+
+def store_inventory(name: str, stamps: Dict[str, Optional[int]],
+                    available: List[str], current: Optional[str]):
+    with _lock:
+        data = _read_cache()
+        data["version"] = CACHE_VERSION
+        data.setdefault("inventories", {})[name] = {
+            "sources": stamps,
+            "available": available,
+            "current": current
+        }
+
+        try:
+            atomic_write(inventory_file(), json.dumps(data))
+        except OSError:
+            pass  # An unwritable cache only costs a refetch next run
+
+
+def cached_inventory(fetch):
+    """Wrap an attribute fetch classmethod with the on-disk inventory cache.
+
+    The wrapped class provides ``sources()``, the directories and config files
+    whose mtimes decide whether a cached inventory is still valid. The same
+    check applies to the inventory held in memory, so a long-running process
+    sees themes installed after it started.
+    """
+
+    @functools.wraps(fetch)
+    def wrapper(cls) -> Tuple[List[str], Optional[str]]:
+        # Stamp sources before fetching so changes made mid-fetch invalidate
+        stamps = fingerprint(cls.sources())
+        if cls.available and getattr(cls, "inventory_stamps", None) == stamps:
+            return cls.available, cls.current
+
+        cached = load_inventory(cls.__name__, stamps)
+        if cached:
+            cls.available, cls.current = cached
+        else:
+            cls.available, cls.current = fetch(cls)
+            store_inventory(cls.__name__, stamps, list(cls.available),
+                            cls.current)
+
+        cls.inventory_stamps = stamps
+        return cls.available, cls.current
+
+    return wrapper
+
+
+def normalized_calendars(times: List[str]) -> Dict[str, str]:
+    """Normalize OnCalendar times, running systemd-analyze only for new ones.
+
+    Times are normalized in-process where possible. Those only systemd
+    understands are normalized by it in one batch, and cached by the time as
+    written. Raises ValueError naming the first invalid time.
+    """
+    normalized = {}
+    missing = []
+    for time in times:
+        try:
+            normalized[time] = oncalendar.normalize(time)
+        except ValueError:
+            missing.append(time)
+
+    if not missing:
+        return normalized
+
+    try:
+        with open(calendar_file(), "r") as file:
+            data = json.load(file)
+        if data.get("version") != CACHE_VERSION:
+            data = {}
+    except (OSError, ValueError, AttributeError):
+        data = {}
+
+    known = data.get("times", {})
+    new = [t for t in missing if t not in known]
+
+    if new:
+        known.update(normalize_calendars(new))
+
+        with _lock:
+            try:
+                atomic_write(
+                    calendar_file(),
+                    json.dumps({
+                        "version": CACHE_VERSION,
+                        "times": known
+                    }))
+            except OSError:
+                pass  # Normalized again next run
+
+    for time in missing:
+        if time not in known:
+            raise ValueError("Invalid systemd calendar time!: " + time)
+        normalized[time] = known[time]
+
+    return normalized
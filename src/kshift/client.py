@@ -0,0 +1,28 @@
+import os
+import sys
+
+from kshift import daemon
+
+
+def main():
+    """Entry point of the kshift command.
+
+    Hands commands to a running daemon before importing the CLI, so a
+    forwarded command never loads the config, themes or their dependencies.
+    """
+    args = sys.argv[1:]
+    command = args[0] if args else None
+
+    if command in daemon.DAEMON_COMMANDS and "--help" not in args:
+        response = daemon.request(args,
+                                  {"SOURCE": os.getenv("SOURCE", "direct")})
+        if response is not None:
+            print(response["output"], end="")
+            sys.exit(response["code"])
+
+    from kshift.main import cli
+    cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,56 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import copy
+import fcntl
+import hashlib
 import os
+import threading
+import typing
 import yaml
 import re
 import colorama
-import subprocess
-import requests
 import json
 
-from kshift.theme import Theme
+from kshift.cache import cache_dir, fingerprint, normalized_calendars
+from kshift.sun import SunResolver, SunTimes, sun_times_on
+from kshift.systemd import Systemctl
+from kshift.theme import (ATTRIBUTES, Theme, BaseAttribute, discover,
+                          is_clock_time, clock_time)
+from kshift.utils import atomic_write, xdg_config_home
 
 from pathlib import Path
 
-from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Dict
+from pydantic import (BaseModel, Field, PrivateAttr, field_validator,
+                      model_validator)
+from typing import Dict, Literal, Optional, Tuple
+
+# Sun positions a theme time can name
+SUN_EVENTS = ("sunrise", "sunset", "civil_dawn", "civil_dusk", "nautical_dawn",
+              "nautical_dusk")
+
+# Minutes web sun times may differ from computed ones before kshift warns
+SUN_TOLERANCE = 15
+
+SUN_API = "https://api.sunrisesunset.io/json"
+
+# Shared by every config in the process, so each location's sun data is
+# looked up once a day
+sun_resolver = SunResolver()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# One pooled HTTP session for every sun data request in the process
+def http_session():
+    global _session
+    import requests
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+
+    return _session
+
 
 defaults = {
     "latitude": 39,
@@ -22,13 +60,50 @@ defaults = {
     "rise_delay": 0,
     "set_delay": 0,
     "net_timeout": 10,
+    "max_staleness": 3,
+    "prefetch_days": 7,
     "themes": {
-        'day': Theme(colorscheme="BreezeLight", time=["sunrise"]),
-        'night': Theme(colorscheme="BreezeDark", time=["sunset"]),
+        'day': {
+            "colorscheme": "BreezeLight",
+            "time": ["sunrise"]
+        },
+        'night': {
+            "colorscheme": "BreezeDark",
+            "time": ["sunset"]
+        },
     }
 }
 
 
+class SunData(BaseModel):
+    """A day's sun times as resolved for a config."""
+    times: SunTimes
+    # False for stale or fallback times, which must not be snapshotted
+    cacheable: bool = True
+
+
+def config_path() -> Path:
+    return xdg_config_home() / "kshift" / "kshift.yml"
+
+
+def set_attribute_modes(strict: bool, backend: str):
+    """Set how theme attributes are validated and where inventories come from."""
+    BaseAttribute.strict = strict
+
+    if backend == "cli":
+        BaseAttribute.backends = ["cli"]
+    else:
+        BaseAttribute.backends = ["native", "cli"]
+
+
+# Built per Config, so importing this module validates no theme
+def default_themes() -> Dict[str, Theme]:
+    return {
+        name: Theme(**theme)
+        for name, theme in copy.deepcopy(defaults["themes"]).items()
+    }
+
+
 class Config(BaseModel):
     # YAML Variables
     latitude: float = Field(
@@ -61,13 +136,50 @@ class Config(BaseModel):
         description="Hour delay for sunset, between -23 and 23.")
 
     webdata: bool = Field(
-        True, description="Whether to fetch sunrise/sunset data from the web.")
+        True,
+        description=
+        "Whether to check the computed sunrise/sunset against web data. Without it the sunrise/sunset settings are used."
+    )
+    sun_source: Optional[Literal["web", "computed", "config"]] = Field(
+        None,
+        description=
+        "Where sunrise and sunset come from: the web, computed on this machine, or the sunrise/sunset settings. Defaults to computed with webdata, the settings without."
+    )
     net_timeout: int = Field(
         defaults["net_timeout"],
         ge=0,
         le=60,
         description="Network timeout in seconds, between 0 and 60.")
-    themes: Dict[str, Theme] = Field(defaults["themes"],
+    max_staleness: int = Field(
+        defaults["max_staleness"],
+        ge=0,
+        le=30,
+        description=
+        "Days cached web sun data is used for while it is refreshed in the background, between 0 and 30."
+    )
+    prefetch_days: int = Field(
+        defaults["prefetch_days"],
+        ge=1,
+        le=30,
+        description=
+        "Days of web sun data fetched at once, starting today, between 1 and 30."
+    )
+    strict: bool = Field(
+        False,
+        description=
+        "Validate every theme attribute when the config is loaded, instead of only before a theme is applied."
+    )
+    inventory_backend: Literal["native", "cli"] = Field(
+        "native",
+        description=
+        "Read installed themes from the XDG data directories, or from the Plasma CLI tools."
+    )
+    history: bool = Field(
+        False,
+        description=
+        "Record every theme apply in a database in the cache directory, for `kshift history`."
+    )
+    themes: Dict[str, Theme] = Field(default_factory=default_themes,
                                      description="Dictionary of themes.")
 
     # Environment-based paths
@@ -105,13 +217,33 @@ class Config(BaseModel):
         Path.home(),
         description="Path to the cache file for sunrise and sunset data.")
 
+    # Cleared when sun data fell back to defaults, which must not be cached
+    _cacheable: bool = PrivateAttr(True)
+
+    # Background refresh of stale web sun data, at most one per config
+    _refresh: Optional[threading.Thread] = PrivateAttr(None)
+
+    @model_validator(mode="before")
+    def set_attribute_modes(cls, values):
+        # Themes are validated after this, with the modes set here
+        if isinstance(values, dict):
+            set_attribute_modes(bool(values.get("strict", False)),
+                                values.get("inventory_backend", "native"))
+
+            # Strict mode validates every theme, so fetch every inventory up
+            # front, in parallel
+            if BaseAttribute.strict:
+                discover()
+
+        return values
+
     @model_validator(mode="after")
     def set_dependant_paths(self):
         # Compute dependent paths
         self.systemd_loc = self.xdg_data / "systemd/user"
         self.config_loc_base = self.xdg_config / "kshift"
         self.config_loc = self.config_loc_base / "kshift.yml"
-        self.sun_api = f"https://api.sunrisesunset.io/json?lat={self.latitude}&lng={self.longitude}"
+        self.sun_api = f"{SUN_API}?lat={self.latitude}&lng={self.longitude}"
         self.api_file = self.xdg_cache / "kshift" / f"{self.latitude}{self.longitude}.out"
 
         return self
@@ -133,6 +265,12 @@ class Config(BaseModel):
         def apply_delay(time_obj: datetime, delay_hours: int) -> datetime:
             return time_obj + timedelta(hours=delay_hours)
 
+        # Every OnCalendar time of every theme, normalized in one go
+        calendars = normalized_calendars([
+            t for config in self.themes.values() for t in config.time
+            if isinstance(t, str) and t and t not in SUN_EVENTS
+        ])
+
         for name, config in self.themes.items():
 
             updated_times = []
@@ -142,31 +280,10 @@ class Config(BaseModel):
                         t = apply_delay(self.get_sundata(t), self.rise_delay)
                     elif t == "sunset":
                         t = apply_delay(self.get_sundata(t), self.set_delay)
-                    else:
-
-                        # Determine if theme time is a valid calendar time
-                        if t:
-                            process = subprocess.run(
-                                ["systemd-analyze", "calendar", t],
-                                stdout=subprocess.PIPE)
-                            stat_code = process.returncode
-
-                            if stat_code == 0:
-                                calendar_time = ""
-                                output = process.stdout.decode('utf-8').strip()
-
-                                for line in output.splitlines():
-                                    r = re.search("Normalized form: (.*)",
-                                                  line)
-                                    if r:
-                                        calendar_time = r.group(1)
-                                        break
-
-                                t = calendar_time
-
-                            else:
-                                raise ValueError(
-                                    "Invalid systemd calendar time!: " + t)
+                    elif t in SUN_EVENTS:
+                        t = self.get_sundata(t)
+                    elif t:
+                        t = calendars[t]
 
                     updated_times.append(t)
                 elif isinstance(t, datetime):
@@ -180,33 +297,47 @@ class Config(BaseModel):
 
         return self
 
+    def check(self):
+        """Validate every theme, fetching the inventories they use at once."""
+        names = {
+            attr.name
+            for theme in self.themes.values()
+            for attr in theme.attributes()
+        }
+        discover(names)
+
+        for theme in self.themes.values():
+            theme.check()
+
+        return self
+
     # Prints the status of Kshift, the timer, and the current config file
     def status(self):
         if self.systemd_loc.exists() and self.config_loc.exists():
 
-            timer_status_cmd = "systemctl --user is-enabled "
-            enabled = False
-            timed_outputs = ""
+            timers = sorted(f.name
+                            for f in self.systemd_loc.glob("kshift-*.timer"))
 
-            for f in os.listdir(self.systemd_loc):
-                if 'kshift-' in f and '.timer' in f:
-                    timer_status = subprocess.run(
-                        (timer_status_cmd + f).split(),
-                        stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
+            # Every timer's state from a single systemctl call
+            statuses = Systemctl().timers(timers)
+            enabled = any(status.enabled for status in statuses.values())
+            timed_outputs = ""
 
-                    if timer_status == "enabled":
-                        enabled = True
+            def when(time):
+                return f"{time:%Y-%m-%d %H:%M}" if time else "-"
 
-                        theme_name = f.replace(".timer", "").split("-")[1]
+            for f in timers:
+                status = statuses.get(f)
+                if status and status.enabled:
+                    theme_name = f.replace(".timer", "").split("-", 1)[1]
 
-                        timer = open(self.systemd_loc / f, "r")
-                        for line in timer:
-                            m = re.search("OnCalendar=(.*)", line)
-                            if m:
-                                time = m.group(1)
-                                timed_outputs += f"{theme_name:<10} {time}\n"
+                    with open(self.systemd_loc / f, "r") as timer:
+                        times = re.findall("OnCalendar=(.*)", timer.read())
 
-                        timer.close()
+                    timed_outputs += (
+                        f"{theme_name:<10} {', '.join(times) or '-':<20} "
+                        f"last: {when(status.last)}  "
+                        f"next: {when(status.next)}\n")
 
             if enabled:
                 print("kshift status: " + colorama.Fore.GREEN + "ENABLED" +
@@ -229,111 +360,413 @@ class Config(BaseModel):
             raise ValueError(
                 f"Invalid sunstate '{sunstate}'. Use 'sunrise' or 'sunset'.")
 
-    # Gets the sundata from the internet and writes it to a tmp file
+    # Warns when web sun times disagree with the computed ones, usually a
+    # sign of a wrong latitude/longitude
+    def cross_check(self, web: SunTimes, computed: SunTimes):
+        for name in ("sunrise", "sunset"):
+            fetched, expected = getattr(web, name), getattr(computed, name)
+            if expected and abs(fetched -
+                                expected) > timedelta(minutes=SUN_TOLERANCE):
+                print(f"Warning: web {name} {fetched:%H:%M} "
+                      f"differs from the computed {expected:%H:%M}")
+
+    # Cross-checks computed sun times against today's cached web data
     #
-    # Sets sunrise and sunset
-    # Returns the correct sunstate
-    def web_sundata(self, sunstate):
-        url = self.sun_api
-        try:
-            response = requests.get(url, timeout=self.net_timeout)
-            response.raise_for_status()
-            data = response.json()
-
-            sunrise = datetime.strptime(data["results"]["sunrise"],
-                                        "%I:%M:%S %p").time()
-            sunset = datetime.strptime(data["results"]["sunset"],
-                                       "%I:%M:%S %p").time()
-
-            self.sunrise = datetime.combine(datetime.now().date(), sunrise)
-            self.sunset = datetime.combine(datetime.now().date(), sunset)
-
-            cache_data = {
-                "location": f"{self.latitude},{self.longitude}",
-                "sunrise": self.sunrise.isoformat(),
-                "sunset": self.sunset.isoformat()
+    # The cache is refreshed in the background when it has no entry for
+    # today, so no theme switch waits for the network
+    def check_webdata(self, computed: SunTimes):
+        today = datetime.now().date()
+        cached = self.cached_sundata()
+        if today not in cached:
+            self.revalidate_sundata()
+            return
+
+        sunrise, sunset = cached[today]
+        self.cross_check(
+            computed.model_copy(update={
+                "sunrise": sunrise,
+                "sunset": sunset
+            }), computed)
+
+    # Gets prefetch_days of sundata from the internet in one request and
+    # merges them into the cache file
+    #
+    # Returns today's sunrise and sunset, raises on network and format errors
+    def fetch_sundata(self):
+        today = datetime.now().date()
+        last = today + timedelta(days=self.prefetch_days - 1)
+
+        response = http_session().get(self.sun_api,
+                                      params={
+                                          "date_start": today.isoformat(),
+                                          "date_end": last.isoformat()
+                                      },
+                                      timeout=self.net_timeout)
+        response.raise_for_status()
+        results = response.json()["results"]
+
+        # A single day comes back as one result instead of a list
+        if isinstance(results, dict):
+            results = [{"date": today.isoformat(), **results}]
+
+        days = {
+            day: times
+            for day, times in self.cached_sundata().items() if day >= today
+        }
+        for result in results:
+            try:
+                day = date.fromisoformat(result["date"])
+                days[day] = tuple(
+                    datetime.combine(
+                        day,
+                        datetime.strptime(result[name], "%I:%M:%S %p").time())
+                    for name in ("sunrise", "sunset"))
+            except (KeyError, TypeError, ValueError):
+                continue  # Days without a sunrise or sunset, near the poles
+
+        cache_data = {
+            "location": f"{self.latitude},{self.longitude}",
+            "days": {
+                day.isoformat(): {
+                    "sunrise": sunrise.isoformat(),
+                    "sunset": sunset.isoformat()
+                }
+                for day, (sunrise, sunset) in sorted(days.items())
             }
+        }
+        atomic_write(self.api_file, json.dumps(cache_data))
+
+        return days[today]
 
-            cache_dir = self.api_file.parent
-            cache_dir.mkdir(parents=True, exist_ok=True)
-            with open(self.api_file, "w") as file:
-                json.dump(cache_data, file)
+    # Gets the sundata from the internet
+    # Returns sunrise and sunset, or None when computed times must do
+    def web_sundata(self):
+        import requests
+
+        url = self.sun_api
+        try:
+            return self.fetch_sundata()
 
         except requests.exceptions.ConnectionError as e:
             print(
-                f"Connection error: {e}. Could not connect to {url}. Falling back to defaults."
+                f"Connection error: {e}. Could not connect to {url}. Falling back to computed times."
             )
         except requests.exceptions.Timeout as e:
             print(
-                f"Timeout error: {e}. The request to {url} took too long. Falling back to defaults."
+                f"Timeout error: {e}. The request to {url} took too long. Falling back to computed times."
             )
         except requests.exceptions.HTTPError as e:
             print(
-                f"HTTP error: {e}. Invalid response from the server. Falling back to defaults."
+                f"HTTP error: {e}. Invalid response from the server. Falling back to computed times."
             )
         except json.JSONDecodeError as e:
             print(
-                f"JSON decoding error: {e}. Invalid response format. Falling back to defaults."
+                f"JSON decoding error: {e}. Invalid response format. Falling back to computed times."
             )
         except Exception as e:
-            print(f"Unexpected error: {e}. Falling back to defaults.")
+            print(f"Unexpected error: {e}. Falling back to computed times.")
+
+        return None
+
+    # Reads the sundata cache file for this location
+    # Returns the cached sunrise and sunset by date
+    def cached_sundata(self) -> Dict[date, Tuple[datetime, datetime]]:
+        try:
+            with open(self.api_file, "r") as file:
+                cache_data = json.load(file)
+
+            if cache_data["location"] != f"{self.latitude},{self.longitude}":
+                return {}
+
+            # Caches written before prefetching held a single day
+            entries = cache_data.get("days") or {
+                cache_data["sunrise"][:10]: cache_data
+            }
+
+            days = {}
+            for day, entry in entries.items():
+                days[date.fromisoformat(day)] = (datetime.fromisoformat(
+                    entry["sunrise"]), datetime.fromisoformat(entry["sunset"]))
+
+            return days
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}  # Fetch again if the cache is missing or corrupted
+
+    # Fetches fresh sundata into the cache, unless another run already is
+    # or already did
+    def refresh_sundata(self):
+        self.api_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.api_file.with_suffix(".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+
+            if datetime.now().date() in self.cached_sundata():
+                return
 
-        return self._select_sunstate(sunstate)
+            try:
+                self.fetch_sundata()
+            except Exception as e:
+                print(f"Could not refresh sun data: {e}")
 
-    # Checks to see if sundata is in the designated tmp file, if not, it calls web_sundata
+    # Starts refreshing stale sundata in a background thread
+    #
+    # The thread is not a daemon, so a short run still finishes the refresh
+    # before exiting, after its theme was applied
+    def revalidate_sundata(self):
+        if self._refresh is None:
+            self._refresh = threading.Thread(target=self.refresh_sundata,
+                                             name="kshift-sun-refresh")
+            self._refresh.start()
+
+    # Where sunrise and sunset come from, see sun_source
+    def sun_origin(self) -> str:
+        if self.sun_source:
+            return self.sun_source
+
+        return "computed" if self.webdata else "config"
+
+    # Looks up today's sun times at the configured location
+    #
+    # Sunrise and sunset are computed, and checked against web data when
+    # webdata is on. Without webdata they are the sunrise and sunset
+    # settings. Twilight is always computed.
+    #
+    # With sun_source web they come from the cache file of prefetched days.
+    # When it has no entry for today, the latest day up to max_staleness days
+    # old is used as is and refreshed in the background.
+    def lookup_sundata(self) -> SunData:
+        today = datetime.now().date()
+        computed = sun_times_on(self.latitude, self.longitude, today)
+        origin = self.sun_origin()
+        if origin == "computed":
+            if self.webdata:
+                self.check_webdata(computed)
+            return SunData(times=computed)
+        elif origin == "config":
+            # Keeps the configured sunrise and sunset, twilight is computed
+            return SunData(times=computed.model_copy(update={
+                "sunrise": None,
+                "sunset": None
+            }))
+
+        # Today's times, or else the latest before today
+        cached = self.cached_sundata()
+        known = [day for day in cached if day <= today]
+        if known:
+            latest = max(known)
+            age = (today - latest).days
+
+            # Sunrise and sunset move minutes a day, yesterday's are close
+            if age <= self.max_staleness:
+                if age > 0:
+                    self.revalidate_sundata()
+
+                sunrise, sunset = cached[latest]
+                times = computed.model_copy(
+                    update={
+                        "sunrise": datetime.combine(today, sunrise.time()),
+                        "sunset": datetime.combine(today, sunset.time())
+                    })
+                return SunData(times=times, cacheable=age == 0)
+
+        # Fetch fresh data if the cache is too old or missing
+        fetched = self.web_sundata()
+        if fetched is None:
+            return SunData(times=computed, cacheable=False)
+
+        times = computed.model_copy(update={
+            "sunrise": fetched[0],
+            "sunset": fetched[1]
+        })
+        self.cross_check(times, computed)
+        return SunData(times=times)
+
+    # Resolves today's sun data once per location for the whole process
+    # Keeps the default sunrise and sunset where the sun does not rise or set
     # Returns the correct sunstate
     def get_sundata(self, sunstate):
-        if self.webdata is False:
+        data = sun_resolver.resolve(self.latitude, self.longitude,
+                                    datetime.now().date(), self.sun_origin(),
+                                    self.lookup_sundata)
+        if not data.cacheable:
+            self._cacheable = False
+
+        self.sunrise = data.times.sunrise or self.sunrise
+        self.sunset = data.times.sunset or self.sunset
+
+        if sunstate in ("sunrise", "sunset"):
             return self._select_sunstate(sunstate)
 
-        elif self.api_file.exists():
-            try:
-                with open(self.api_file, "r") as file:
-                    cache_data = json.load(file)
-                    cache_data["sunrise"] = datetime.fromisoformat(
-                        cache_data["sunrise"])
-                    cache_data["sunset"] = datetime.fromisoformat(
-                        cache_data["sunset"])
+        # Twilight that never ends falls back to the matching sun event
+        event = getattr(data.times, sunstate)
+        if event is None:
+            return self._select_sunstate(
+                "sunrise" if sunstate.endswith("dawn") else "sunset")
+
+        return event
+
+
+###################################
+# Compiled snapshot
+###################################
+
+SNAPSHOT_VERSION = 1
 
-                if cache_data[
-                        "location"] == f"{self.latitude},{self.longitude}":
 
-                    self.sunrise = datetime.combine(
-                        datetime.now().date(), cache_data["sunrise"].time())
-                    self.sunset = datetime.combine(datetime.now().date(),
-                                                   cache_data["sunset"].time())
+def snapshot_file() -> Path:
+    return cache_dir() / "config.snapshot.json"
 
-                if cache_data["sunrise"].date() == datetime.today().date(
-                ) and cache_data["sunset"].date() == datetime.today().date():
-                    return self._select_sunstate(sunstate)
 
-            except (ValueError, IndexError):
-                pass  # Fall back to fetching data if the cache is corrupted
+# Identifies a config file's content as resolved on a given date
+def snapshot_key(raw: bytes) -> str:
+    digest = hashlib.sha256(raw).hexdigest()
+    return f"{SNAPSHOT_VERSION}:{datetime.now().date().isoformat()}:{digest}"
 
-        # Fetch fresh data if the cache is invalid or missing
-        return self.web_sundata(sunstate)
+
+# Builds a model from its JSON dump without running any validator
+def _construct(model, data: dict):
+    fields = {}
+    for name, value in data.items():
+        info = model.model_fields.get(name)
+        if info is None:
+            continue
+
+        kinds = typing.get_args(info.annotation) or (info.annotation, )
+        if value is not None and Path in kinds:
+            value = Path(value)
+        elif value is not None and datetime in kinds:
+            value = datetime.fromisoformat(value)
+
+        fields[name] = value
+
+    return model.model_construct(**fields)
+
+
+def _dump_time(raw, resolved):
+    # HH:MM times are stored raw, their date depends on the time of day
+    if isinstance(raw, str) and is_clock_time(raw):
+        return {"clock": raw}
+    elif isinstance(resolved, datetime):
+        return {"at": resolved.isoformat()}
+    else:
+        return {"calendar": resolved}
+
+
+def _load_time(entry):
+    if "clock" in entry:
+        return clock_time(entry["clock"])
+    elif "at" in entry:
+        return datetime.fromisoformat(entry["at"])
+    else:
+        return entry["calendar"]
+
+
+def save_snapshot(config: Config, raw: bytes, config_data: dict):
+    """Store the validated config with its times and paths resolved."""
+    themes = {}
+    for name, theme in config.themes.items():
+        raw_times = (config_data.get("themes") or {}).get(name, {})
+        raw_times = raw_times.get("time", []) if isinstance(raw_times,
+                                                            dict) else []
+        if isinstance(raw_times, str):
+            raw_times = [raw_times]
+        if len(raw_times) != len(theme.time):
+            raw_times = [None] * len(theme.time)
+
+        themes[name] = {
+            "attributes": {
+                attr.name: attr.model_dump(mode="json")
+                for attr in theme.attributes()
+            },
+            "command": theme.command,
+            "enabled": theme.enabled,
+            "time": [_dump_time(r, t) for r, t in zip(raw_times, theme.time)],
+        }
+
+    snapshot = {
+        "key": snapshot_key(raw),
+        "sources": fingerprint([config.api_file]),
+        "config": config.model_dump(mode="json", exclude={"themes"}),
+        "themes": themes,
+    }
+
+    try:
+        atomic_write(snapshot_file(), json.dumps(snapshot))
+    except OSError:
+        pass  # Without a snapshot the next run validates again
+
+
+def load_snapshot(raw: bytes) -> Optional[Config]:
+    """Rehydrate the config snapshot for this config file content and date.
+
+    Returns None when there is no snapshot, or the config file, date or sun
+    data cache changed since it was written.
+    """
+    try:
+        with open(snapshot_file(), "r") as file:
+            snapshot = json.load(file)
+
+        if snapshot["key"] != snapshot_key(raw):
+            return None
+
+        data = snapshot["config"]
+        if snapshot["sources"] != fingerprint([Path(data["api_file"])]):
+            return None
+
+        themes = {}
+        for name, theme in snapshot["themes"].items():
+            attributes = {
+                attr: _construct(ATTRIBUTES[attr], value)
+                for attr, value in theme["attributes"].items()
+            }
+            themes[name] = Theme.model_construct(
+                command=theme["command"],
+                enabled=theme["enabled"],
+                time=[_load_time(t) for t in theme["time"]],
+                **attributes)
+
+        config = _construct(Config, data)
+        config.themes = themes
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    set_attribute_modes(config.strict, config.inventory_backend)
+    return config
 
 
 def load_config() -> Config:
     # Determine the config file path
-    config_base = Path.home() / ".config/kshift"
-    config_file = config_base / "kshift.yml"
+    config_file = config_path()
+    raw = config_file.read_bytes() if config_file.exists() else b""
+
+    # The common path, nothing changed since the config was last validated
+    config = load_snapshot(raw)
+    if config:
+        return config
 
-    config_data = defaults
+    config_data = copy.deepcopy(defaults)
 
     # If user configuration exists, overwrite the defaults
     if config_file.exists():
-        with open(config_file, "r") as file:
-            try:
-                user_data = yaml.safe_load(file)
-                config_data.update(user_data)  # Merge user data into defaults
-            except yaml.YAMLError as e:
-                print(f"Error reading kshift.yml: {e}")
-                raise
+        try:
+            user_data = yaml.safe_load(raw)
+            config_data.update(user_data)  # Merge user data into defaults
+        except yaml.YAMLError as e:
+            print(f"Error reading kshift.yml: {e}")
+            raise
     else:
         print(
             f"User configuration file not found at {config_file}. Using defaults."
         )
 
-    # Instantiate and return the Config object
-    return Config(**config_data)
+    # Instantiate the Config object
+    config = Config(**config_data)
+
+    # Strict mode is for editing the config, which always validates it
+    if config._cacheable and not config.strict:
+        save_snapshot(config, raw, config_data)
+
+    return config
@@ -0,0 +1,186 @@
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from kshift.utils import xdg_cache_home
+
+# Seconds a client waits for the daemon to finish a command
+CLIENT_TIMEOUT = 120
+
+# Commands a running daemon executes for the CLI, None being plain `kshift`
+DAEMON_COMMANDS = (None, "theme", "status", "list")
+
+# Commands run one at a time, so their redirected output and environment
+# never interleave
+lock = threading.Lock()
+
+
+def socket_path() -> Path:
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "kshift.sock"
+
+    return xdg_cache_home() / "kshift" / "kshift.sock"
+
+
+def running() -> bool:
+    """Whether a daemon is accepting connections on the socket."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path()))
+        return True
+    except OSError:
+        return False
+
+
+def request(args: List[str], env: Dict[str, str]) -> Optional[dict]:
+    """Run a command in the daemon, or return None if none is running.
+
+    The command runs in the client's working directory. The response holds
+    its ``output`` and exit ``code``.
+    """
+    path = socket_path()
+    if not path.exists():
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(str(path))
+            sock.sendall(
+                json.dumps({
+                    "args": args,
+                    "env": env,
+                    "cwd": os.getcwd()
+                }).encode() + b"\n")
+
+            with sock.makefile("r") as reader:
+                return json.loads(reader.readline())
+    except (OSError, ValueError):
+        # A stale socket or a daemon dying mid-command, run it locally instead
+        return None
+
+
+def capture(run: Callable[[List[str]], int],
+            args: List[str],
+            env: Dict[str, str],
+            cwd: Optional[str] = None) -> dict:
+    """Run a command with its output captured for the client.
+
+    Output of the programs it runs, like the Plasma tools and theme
+    commands, is captured too, by pointing file descriptors 1 and 2 at the
+    same file as Python's output.
+    """
+    saved_env = {key: os.environ.get(key) for key in env}
+    saved_cwd = os.getcwd()
+    saved_fds = []
+
+    with tempfile.TemporaryFile() as file:
+        output = open(file.fileno(),
+                      "w",
+                      buffering=1,
+                      errors="replace",
+                      closefd=False)
+
+        os.environ.update(env)
+        try:
+            if cwd:
+                os.chdir(cwd)
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd in (1, 2):
+                saved_fds.append(os.dup(fd))
+                os.dup2(file.fileno(), fd)
+
+            with redirect_stdout(output), redirect_stderr(output):
+                code = run(args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            output.write(f"Error: {e}\n")
+            code = 1
+        finally:
+            output.flush()
+            for fd, saved in zip((1, 2), saved_fds):
+                os.dup2(saved, fd)
+                os.close(saved)
+
+            os.chdir(saved_cwd)
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+        file.seek(0)
+        text = file.read().decode("utf-8", errors="replace")
+        output.close()
+
+    return {"output": text, "code": code}
+
+
+def execute(run: Callable[[List[str]], int],
+            args: List[str],
+            env: Dict[str, str],
+            cwd: Optional[str] = None) -> dict:
+    with lock:
+        return capture(run, args, env, cwd)
+
+
+async def serve(run: Callable[[List[str]], int]):
+    """Serve commands on the daemon socket until cancelled.
+
+    ``run`` executes a command line, such as ``["theme", "night"]``, and
+    returns its exit code. Commands run one at a time in a worker thread.
+    """
+    # Imported here, clients only need request()
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (RuntimeError, ValueError):
+        pass  # Signal handlers can only be set from the main thread
+
+    async def handle(reader, writer):
+        try:
+            message = json.loads(await reader.readline())
+            response = await loop.run_in_executor(None, execute, run,
+                                                  message.get("args", []),
+                                                  message.get("env", {}),
+                                                  message.get("cwd"))
+        except ValueError:
+            response = {"output": "Error: malformed request\n", "code": 1}
+
+        try:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    if running():
+        raise RuntimeError(f"kshift daemon already running on {socket_path()}")
+
+    # Anything left at the path is a socket of a daemon that died
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+
+    server = await asyncio.start_unix_server(handle, path=str(path))
+    os.chmod(path, 0o600)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,172 @@
+import json
+import re
+import sqlite3
+
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from kshift.apply import Plan, StepResult
+from kshift.cache import cache_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applies (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    theme TEXT,
+    source TEXT NOT NULL,
+    duration REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    plan TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS applies_time ON applies (time);
+CREATE INDEX IF NOT EXISTS applies_theme ON applies (theme, time);
+CREATE INDEX IF NOT EXISTS applies_source ON applies (source, time);
+
+CREATE TABLE IF NOT EXISTS steps (
+    apply_id INTEGER NOT NULL REFERENCES applies (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    returncode INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS steps_apply ON steps (apply_id);
+"""
+
+
+def history_file() -> Path:
+    return cache_dir() / "history.sqlite3"
+
+
+def connect() -> sqlite3.Connection:
+    path = history_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    db = sqlite3.connect(path, timeout=5)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+
+    return db
+
+
+class Apply(BaseModel):
+    """A theme apply as recorded in the history."""
+    time: datetime
+    theme: Optional[str]
+    source: str
+    duration: float
+    ok: bool
+    steps: List[StepResult] = []
+
+    def __str__(self) -> str:
+        status = "ok" if self.ok else "failed"
+        return (f"{self.time:%Y-%m-%d %H:%M:%S}  {self.theme or '-':<12} "
+                f"{self.source:<10} {self.duration:6.2f}s  {status}")
+
+
+class ApplyStats(BaseModel):
+    theme: Optional[str]
+    count: int
+    failed: int
+    mean: float
+    max: float
+
+    def __str__(self) -> str:
+        return (f"{self.theme or '-':<12} {self.count:>6} {self.failed:>6} "
+                f"{self.mean:8.2f}s {self.max:8.2f}s")
+
+
+def record(theme: Optional[str], source: str, plan: Plan,
+           results: List[StepResult], duration: float):
+    """Store an apply with its plan and how long each step took."""
+    with closing(connect()) as db, db:
+        cursor = db.execute(
+            "INSERT INTO applies (time, theme, source, duration, ok, plan) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (datetime.now().timestamp(), theme, source, duration,
+             all(r.ok for r in results),
+             json.dumps([c.model_dump() for c in plan.changes])))
+
+        db.executemany(
+            "INSERT INTO steps (apply_id, name, ok, duration, returncode, "
+            "error) VALUES (?, ?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, r.name, r.ok, r.duration, r.returncode,
+              r.error) for r in results])
+
+
+def parse_since(text: str) -> datetime:
+    """A start time given as a duration ago, like 7d or 12h, or a date."""
+    r = re.fullmatch(r"(\d+)([mhdw])", text)
+    if r:
+        unit = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+        return datetime.now() - timedelta(
+            **{unit[r.group(2)]: int(r.group(1))})
+
+    return datetime.fromisoformat(text)
+
+
+def _where(since: Optional[datetime], theme: Optional[str],
+           source: Optional[str]):
+    clauses, args = [], []
+    if since:
+        clauses.append("time >= ?")
+        args.append(since.timestamp())
+    if theme:
+        clauses.append("theme = ?")
+        args.append(theme)
+    if source:
+        clauses.append("source = ?")
+        args.append(source)
+
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), args
+
+
+def query(since: Optional[datetime] = None,
+          theme: Optional[str] = None,
+          source: Optional[str] = None) -> List[Apply]:
+    """Recorded applies, oldest first."""
+    where, args = _where(since, theme, source)
+
+    with closing(connect()) as db, db:
+        applies = db.execute(f"SELECT * FROM applies {where} ORDER BY time",
+                             args).fetchall()
+
+        steps = {}
+        for step in db.execute(
+                "SELECT * FROM steps WHERE apply_id IN "
+                f"(SELECT id FROM applies {where})", args):
+            steps.setdefault(step["apply_id"], []).append(
+                StepResult(name=step["name"],
+                           ok=bool(step["ok"]),
+                           duration=step["duration"],
+                           returncode=step["returncode"],
+                           error=step["error"]))
+
+    return [
+        Apply(time=datetime.fromtimestamp(a["time"]),
+              theme=a["theme"],
+              source=a["source"],
+              duration=a["duration"],
+              ok=bool(a["ok"]),
+              steps=steps.get(a["id"], [])) for a in applies
+    ]
+
+
+def stats(since: Optional[datetime] = None,
+          theme: Optional[str] = None,
+          source: Optional[str] = None) -> List[ApplyStats]:
+    """Apply counts and latencies per theme."""
+    where, args = _where(since, theme, source)
+
+    with closing(connect()) as db, db:
+        rows = db.execute(
+            "SELECT theme, COUNT(*) AS count, SUM(NOT ok) AS failed, "
+            "AVG(duration) AS mean, MAX(duration) AS max "
+            f"FROM applies {where} GROUP BY theme ORDER BY theme",
+            args).fetchall()
+
+    return [ApplyStats(**dict(row)) for row in rows]
@@ -0,0 +1,72 @@
+import os
+
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from kshift.state import kconfig_value
+from kshift.utils import xdg_data_dirs
+
+
+def icon_dirs() -> List[Path]:
+    return [Path.home() / ".icons"] + [d / "icons" for d in xdg_data_dirs()]
+
+
+def scan_names(dirs: List[Path], match: Callable[[os.DirEntry],
+                                                 Optional[str]]) -> List[str]:
+    """Collect names from every directory, earlier directories first.
+
+    ``match`` maps a directory entry to a theme name, or None to skip it.
+    Duplicate names, a user theme overriding a system one, are listed once.
+    """
+    names = []
+    for d in dirs:
+        try:
+            with os.scandir(d) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    name = match(entry)
+                    if name and name not in names:
+                        names.append(name)
+        except OSError:
+            continue
+
+    return names
+
+
+def _colorscheme(entry: os.DirEntry) -> Optional[str]:
+    if entry.name.endswith(".colors") and entry.is_file():
+        return entry.name[:-len(".colors")]
+    return None
+
+
+def _cursortheme(entry: os.DirEntry) -> Optional[str]:
+    if entry.is_dir() and os.path.isdir(os.path.join(entry.path, "cursors")):
+        return entry.name
+    return None
+
+
+def _desktoptheme(entry: os.DirEntry) -> Optional[str]:
+    if entry.is_dir() and any(
+            os.path.isfile(os.path.join(entry.path, metadata))
+            for metadata in ("metadata.json", "metadata.desktop")):
+        return entry.name
+    return None
+
+
+def colorschemes() -> Tuple[List[str], Optional[str]]:
+    """Installed colorschemes from color-schemes/*.colors."""
+    available = scan_names([d / "color-schemes" for d in xdg_data_dirs()],
+                           _colorscheme)
+    return available, kconfig_value("kdeglobals", "General", "ColorScheme")
+
+
+def cursorthemes() -> Tuple[List[str], Optional[str]]:
+    """Installed cursor themes, icon themes that ship a cursors directory."""
+    available = scan_names(icon_dirs(), _cursortheme)
+    return available, kconfig_value("kcminputrc", "Mouse", "cursorTheme")
+
+
+def desktopthemes() -> Tuple[List[str], Optional[str]]:
+    """Installed Plasma styles from plasma/desktoptheme/*/metadata.*."""
+    available = scan_names(
+        [d / "plasma/desktoptheme" for d in xdg_data_dirs()], _desktoptheme)
+    return available, kconfig_value("plasmarc", "Theme", "name")
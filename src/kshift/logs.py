@@ -0,0 +1,183 @@
+import ctypes
+import json
+import os
+import re
+import select
+import time
+
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Bytes read at a time when reading a log backwards
+BLOCK_SIZE = 8192
+
+# Seconds between checks for new lines when inotify is unavailable, and the
+# longest wait for an inotify event before checking anyway
+POLL_INTERVAL = 1.0
+
+# inotify(7) events on the log directory that may mean new lines
+IN_MODIFY = 0x002
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+
+
+def log_files(path: Path) -> List[Path]:
+    """The log and its rotated backups, oldest first."""
+    backups = []
+    for backup in path.parent.glob(f"{path.name}.*"):
+        suffix = backup.name[len(path.name) + 1:]
+        if suffix.isdigit():
+            backups.append((int(suffix), backup))
+
+    files = [backup for _, backup in sorted(backups, reverse=True)]
+    return files + [path] if path.exists() else files
+
+
+def _tail_file(path: Path, n: int) -> List[str]:
+    with open(path, "rb") as file:
+        end = file.seek(0, os.SEEK_END)
+        data = b""
+
+        # One newline more than lines wanted, the first line may be partial
+        while end > 0 and data.count(b"\n") <= n:
+            start = max(end - BLOCK_SIZE, 0)
+            file.seek(start)
+            data = file.read(end - start) + data
+            end = start
+
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-n:] if n else []
+
+
+def tail(path: Path, n: int) -> List[str]:
+    """The last ``n`` lines of the log, reading backups only if needed."""
+    lines = []
+    for file in reversed(log_files(path)):
+        lines = _tail_file(file, n - len(lines)) + lines
+        if len(lines) >= n:
+            break
+
+    return lines
+
+
+def read_all(path: Path) -> Iterator[str]:
+    """Every line of the log, starting with the oldest backup."""
+    for file in log_files(path):
+        with open(file, "r", errors="replace") as f:
+            yield from f
+
+
+def decode(line: str) -> Optional[dict]:
+    """The event a log line records, with its ``time`` and ``level``."""
+    r = re.match(r"(\S+ \S+) - (\w+) - (.*)", line)
+    if not r:
+        return None
+
+    try:
+        event = json.loads(r.group(3))
+        logged = datetime.strptime(r.group(1), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+    if not isinstance(event, dict):
+        return None
+
+    return {"time": logged.isoformat(), "level": r.group(2), **event}
+
+
+class _Watcher:
+    """Waits for changes in a directory, with inotify if the system has it."""
+
+    def __init__(self, directory: Path):
+        self.fd = None
+
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+
+            if libc.inotify_add_watch(fd, bytes(directory),
+                                      IN_MODIFY | IN_CREATE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                return
+
+            self.fd = fd
+        except (OSError, AttributeError):
+            pass  # Not Linux, poll instead
+
+    def wait(self, timeout: float):
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                os.read(self.fd, 4096)
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def follow(path: Path, poll: float = POLL_INTERVAL) -> Iterator[str]:
+    """Yield lines appended to the log after this call.
+
+    When the log is rotated, the rest of the old file is read before
+    following the new one from its start.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    file = None
+    if path.exists():
+        file = open(path, "r", errors="replace")
+        file.seek(0, os.SEEK_END)
+
+    return _follow(path, file, _Watcher(path.parent), poll)
+
+
+def _follow(path: Path, file, watcher: _Watcher, poll: float) -> Iterator[str]:
+    partial = ""
+
+    def complete_lines() -> Iterator[str]:
+        nonlocal partial
+        for chunk in iter(file.readline, ""):
+            partial += chunk
+            if partial.endswith("\n"):
+                yield partial
+                partial = ""
+
+    try:
+        while True:
+            if file:
+                yield from complete_lines()
+
+            # A different file at the path means the log was rotated
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                inode = None
+
+            rotated = inode is not None and (file is None or inode != os.fstat(
+                file.fileno()).st_ino)
+
+            if rotated:
+                if file:
+                    # Lines written just before the rotation
+                    yield from complete_lines()
+                    file.close()
+
+                file = open(path, "r", errors="replace")
+                partial = ""
+                continue
+
+            watcher.wait(poll)
+    finally:
+        if file:
+            file.close()
+        watcher.close()
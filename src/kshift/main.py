@@ -1,98 +1,223 @@
 #!/usr/bin/env python
 
+import asyncio
 import click
 
 from datetime import datetime
+from pathlib import Path
 from os import system, makedirs, getenv
-from re import search
 import subprocess
+import sys
 from shutil import which
+from time import monotonic
 
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import json
 
 from importlib.resources import files
 
-from kshift.conf import load_config
-
-from string import Template
+from kshift import daemon as kshift_daemon
+from kshift import history as kshift_history
+from kshift import systemd as kshift_systemd
+from kshift import logs as kshift_logs
+from kshift.scheduler import Scheduler
+from kshift.conf import Config, config_path, load_config
+from kshift.state import AppliedTheme, last_applied, record_applied
+from kshift.timeline import Timeline
+from kshift.utils import xdg_cache_home
 
 from kshift.theme import *
 
-c = load_config()
+###################################
+# Config
+###################################
+
+# Loaded by the first command that needs it, so `--help`, `logs` and `config`
+# never validate themes, run systemd-analyze or go online
+_config = None
+
+
+def get_config() -> Config:
+    global _config
+
+    if _config is None:
+        _config = load_config()
+
+    return _config
+
+
+# Theme triggers around now, shared by the commands a daemon runs until the
+# config is reloaded or time leaves the window
+_timeline = None
+
+
+def get_timeline(now: datetime) -> Timeline:
+    global _timeline
+
+    c = get_config()
+    if _timeline is None or _timeline[0] is not c or not _timeline[1].covers(
+            now):
+        _timeline = (c, Timeline.build(c.themes, now))
+
+    return _timeline[1]
+
 
 ###################################
 # Logging
 ###################################
 
-log_file = c.xdg_cache / "kshift" / "kshift.log"
-cache_dir = log_file.parent
-cache_dir.mkdir(parents=True, exist_ok=True)
+log_file = xdg_cache_home() / "kshift" / "kshift.log"
+
+_log_listener = None
+
+
+# Installs the log file handler, done once by the first event logged.
+# Records are queued and written by a listener thread, so opening, rotating
+# and flushing the log never holds up a theme change.
+def setup_logging():
+    global _log_listener
+
+    if _log_listener:
+        return
+
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # Setup RotatingFileHandler for the same file, opened on the first write
+    handler = RotatingFileHandler(log_file,
+                                  maxBytes=1 * 1024 * 1024,
+                                  backupCount=1,
+                                  delay=True)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s",
+                                  datefmt="%Y-%m-%d %H:%M:%S")
+    handler.setFormatter(formatter)
 
-# Setup RotatingFileHandler for the same file
-handler = RotatingFileHandler(log_file,
-                              maxBytes=1 * 1024 * 1024,
-                              backupCount=1)
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s",
-                              datefmt="%Y-%m-%d %H:%M:%S")
-handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    _log_listener = QueueListener(records, handler)
+    _log_listener.start()
+    atexit.register(stop_logging)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, handlers=[handler])
+    # Configure logging
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(records))
 
 
-def log_theme_change(theme_name):
+# Writes out every queued record and closes the log file
+def stop_logging():
+    global _log_listener
+
+    if not _log_listener:
+        return
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+
+    _log_listener = None
+
+
+def log_event(log_data):
+    setup_logging()
+    logging.info(json.dumps(log_data))  # Use JSON for structured logs
+
+
+def log_theme_change(theme_name, results=()):
     """
     Log a theme change event with structured data.
     """
     log_data = {
         "event": "theme_change",
         "theme": theme_name,
-        "source": getenv("SOURCE", "direct")
+        "source": getenv("SOURCE", "direct"),
+        "steps": [r.model_dump() for r in results]
     }
-    logging.info(json.dumps(log_data))  # Use JSON for structured logs
+    log_event(log_data)
 
+    theme = get_config().themes.get(theme_name)
+    record_applied(
+        AppliedTheme(
+            theme=theme_name,
+            source=log_data["source"],
+            time=datetime.now(),
+            attributes={attr.name: attr.val
+                        for attr in theme.attributes()} if theme else {}))
 
-def log_element_change(theme: Theme):
-    log_data = {"event": "specific_change", "theme": str(theme)}
-    logging.info(json.dumps(log_data))
+
+def log_element_change(theme: Theme, results=()):
+    log_data = {
+        "event": "specific_change",
+        "theme": str(theme),
+        "steps": [r.model_dump() for r in results]
+    }
+    log_event(log_data)
 
 
 def log_timer_write(themes):
     log_data = {"event": "timers_written", "themes": themes}
-    logging.info(json.dumps(log_data))
+    log_event(log_data)
 
 
 def parse_theme_logs(log_file, reference_time=None):
     """
     Parse the log file to determine the last activated theme.
+
+    Only used when the applied state file is missing, it reads whole logs.
     """
+    c = get_config()
+
+    # The logs it was rotated into, followed by the current log
+    lines = [*kshift_logs.read_all(Path(log_file))]
 
-    last_theme = None
-    reference_time = reference_time or datetime.now()
+    for line in reversed(lines):
+        # Skip lines that aren't properly formatted
+        log_entry = kshift_logs.decode(line)
+        if not log_entry:
+            continue
 
-    with open(log_file, "r") as f:
-        # for line in f:
-        for line in reversed(f.readlines()):
-            try:
-                # Extract JSON from log message
-                timestamp, _, json_data = line.partition("- INFO - ")
-                log_entry = json.loads(json_data)
+        # Check if this log entry is a theme change event
+        if log_entry.get("event") == "theme_change" and log_entry.get(
+                "source") in ("systemd", "scheduler") and c.themes.get(
+                    log_entry.get("theme")):
+            return (log_entry["theme"],
+                    datetime.fromisoformat(log_entry["time"]))
 
-                # Check if this log entry is a theme change event
-                if log_entry.get("event") == "theme_change" and log_entry.get(
-                        "source") == "systemd" and c.themes.get(
-                            log_entry.get("theme")):
+    return None
 
-                    log_time = datetime.fromisoformat(timestamp)
-                    return (log_entry["theme"], log_time)
 
-            except (json.JSONDecodeError, ValueError):
-                # Skip lines that aren't properly formatted
-                continue
+# Applies the changes a theme makes and prints how each step went
+# Returns the step results, or None if the theme is invalid or on a dry run
+def apply_theme(theme: Theme, dry_run=False, name=None):
+    try:
+        plan = theme.check().plan()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    return last_theme
+    for change in plan.changes:
+        if dry_run or not change.apply:
+            print(f"  {change}")
+
+    if dry_run:
+        return None
+
+    start = monotonic()
+    results = theme.kshift(plan)
+    for result in results:
+        print(f"  {result}")
+
+    if get_config().history:
+        kshift_history.record(name, getenv("SOURCE", "direct"), plan, results,
+                              monotonic() - start)
+
+    return results
 
 
 ###################################
@@ -100,118 +225,91 @@ def parse_theme_logs(log_file, reference_time=None):
 ###################################
 
 
-# Writes the timers/services for each timed theme
-def write_systemd():
-
-    def write_timer(path, subs):
-        # write theme timer
-        with open(path, "w") as file:
-            template = Template(
-                open(c.config_loc_base / "templates/template.timer").read())
+# Writes the timers/services for each timed theme, only those that changed
+# Prints what would change instead on a dry run
+def write_systemd(dry_run=False):
+    c = get_config()
 
-            file.write(template.substitute(subs))
+    templates = kshift_systemd.load_templates(c.config_loc_base / "templates")
+    units = kshift_systemd.render_units(c.themes, templates,
+                                        which("kshift") or "kshift")
+    changes = kshift_systemd.plan_units(units, c.systemd_loc)
 
-    def write_service(path, subs):
-        # write theme timer
-        with open(path, "w") as file:
-            template = Template(
-                open(c.config_loc_base / "templates/template.service").read())
+    if dry_run:
+        for change in changes:
+            print(change.diff, end="")
+        if not changes:
+            print("systemd units are up to date")
+        return
 
-            file.write(template.substitute(subs))
+    if not changes:
+        return
 
-    kshift_path = which("kshift") or "kshift"
-    written_timers = []
+    removed = [
+        ch.name for ch in changes if ch.is_timer and ch.action == "remove"
+    ]
+    written = [
+        ch.name for ch in changes if ch.is_timer and ch.action == "write"
+    ]
 
-    # Remove any old timers
-    for name, conf in c.themes.items():
-        timer = c.systemd_loc / f"kshift-{name}.timer"
-        if not conf.time and timer.exists():
-            timer.unlink()
+    systemctl = kshift_systemd.Systemctl()
+    systemctl.disable(removed)
 
-    # Write services for each theme
-    # Write timer if they have 'time' option
-    for (name, conf) in c.themes.items():
+    kshift_systemd.apply_units(changes, c.systemd_loc)
+    systemctl.daemon_reload()
 
-        theme_service_str = " ".join([
-            f'kshift-{x[0]}.service' for x in c.themes.items()
-            if x[0] is not name
+    if written:
+        log_timer_write([
+            t[len(kshift_systemd.UNIT_PREFIX):-len(".timer")] for t in written
         ])
 
-        # Convert any datetime objects to simple HH:MM
-        # Datetime objects were originally in HH:MM or sunset/sunrise
-        # If it is a string, it was a verified OnCalendar time
-        theme_times = []
-        for t in conf.time:
-            if isinstance(t, datetime):
-                t = datetime.strftime(t, "%H:%M")
-
-            theme_times.append(t)
-
-        # Extract old timer times to check if the timer needs to be updated
-        timer_path = (c.systemd_loc / f"kshift-{name}.timer")
-        timer_times = []
-
-        timer_changed = False
-        if timer_path.exists():
-
-            for line in open(timer_path, "r"):
-                r = search("OnCalendar=(.*)\n", line)
-                if r:
-                    timer_times.append(r.group(1))
-
-            timer_changed = timer_times != theme_times
-
-        if not timer_path.exists() or timer_changed:
-
-            calendar_times = ""
-            for t in theme_times:
-                calendar_times += f'OnCalendar={t}\n'
-
-            # Cannot have timer with no timer action
-            if calendar_times:
-                subs = {
-                    "description": f'kshift timer for theme {name}',
-                    "unit_options": f'After={theme_service_str}',
-                    "timer_action": f'{calendar_times}\nPersistent=true'
-                }
-                write_timer(timer_path, subs)
-                written_timers.append(name)
-
-            subs = {
-                "description": f'kshift service for theme {name}',
-                "command": f"{kshift_path} theme {name}"
-            }
-            write_service(c.systemd_loc / f"kshift-{name}.service", subs)
-
-    # write startup timer & service
-    startup_timer = c.systemd_loc / "kshift-startup.timer"
-    startup_service = c.systemd_loc / "kshift-startup.service"
-    if not startup_timer.exists() or not startup_service.exists():
-
-        subs = {
-            "description": 'kshift startup timer',
-            "unit_options": "",
-            "timer_action": 'OnStartupSec=5'
-        }
-        write_timer(startup_timer, subs)
-        written_timers.append("startup")
-
-        subs = {
-            "description": 'kshift startup service',
-            "command": f"{kshift_path}"
-        }
-        write_service(startup_service, subs)
-
-    if len(written_timers) > 0:
-        log_timer_write(written_timers)
-
-        timers_str = ""
-        for t in written_timers:
-            timers_str += f"kshift-{t}.timer "
-
-        system("systemctl --user daemon-reload")
-        system(f"systemctl --user enable { timers_str }")
-        system(f"systemctl --user start { timers_str }")
+        systemctl.enable(written)
+
+
+###################################
+# Daemon
+###################################
+
+# Config file mtime and date the loaded config was resolved for
+config_key = None
+
+
+def current_config_key():
+    path = config_path()
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    return (mtime, datetime.now().date())
+
+
+# Reloads the config once the file is edited or sun times are a day old
+def reload_config():
+    global _config, config_key
+
+    key = current_config_key()
+    if _config is None or key != config_key:
+        _config = load_config()
+
+    config_key = key
+
+
+# Runs a command line forwarded by a client, returning its exit code
+def run_in_daemon(args):
+    reload_config()
+    return cli.main(args=args, prog_name="kshift", standalone_mode=False) or 0
+
+
+# Apply a theme at its time from the daemon's scheduler
+# Unlike the theme command this leaves the systemd units alone
+def apply_scheduled(args):
+    reload_config()
+    name, = args
+    theme = get_config().themes.get(name)
+    if theme is None:
+        print(f"Error: Theme '{name}' not found in configuration.")
+        return 1
+
+    print(f"Applying theme {name}...")
+    log_theme_change(name, apply_theme(theme, name=name))
+    return 0
 
 
 ###################################
@@ -225,7 +323,10 @@ def write_systemd():
 )
 @click.pass_context
 def cli(ctx):
-    """Main entry point for the kshift CLI."""
+    """Main entry point for the kshift CLI.
+
+    Commands handed to a running daemon never get here, see kshift.client.
+    """
     if ctx.invoked_subcommand is None:
         # Call the theme subcommand if no subcommand is provided
         ctx.invoke(theme)
@@ -234,6 +335,7 @@ def cli(ctx):
 # Installs systemd services and timers
 @cli.command(help="Install kshift systemd services")
 def install():
+    c = get_config()
 
     answer = input("Are you sure you want to install kshift? [y/n]: ")
     if answer in ("Y", "y", "yes"):
@@ -259,26 +361,123 @@ def install():
 # Removes kshift timer
 @cli.command(help="Remove kshift systemd services")
 def remove():
+    c = get_config()
 
     answer = input("Are you sure you want to remove kshift? [y/n]: ")
     if answer in ("Y", "y", "yes"):
         print("Removing kshift timers and services...")
 
-        system(f"rm {c.systemd_loc / 'kshift-'}*")
+        units = sorted(c.systemd_loc.glob(f"{kshift_systemd.UNIT_PREFIX}*"))
+
+        systemctl = kshift_systemd.Systemctl()
+        systemctl.disable([u.name for u in units if u.suffix == ".timer"])
+        for unit in units:
+            unit.unlink()
+        systemctl.daemon_reload()
 
-        system("systemctl --user daemon-reload")
+
+@cli.command(help="Update the systemd timers and services to match the config")
+@click.option(
+    "-n",
+    "--dry-run",
+    is_flag=True,
+    help="Show how the unit files would change, without writing them")
+def sync(dry_run):
+    write_systemd(dry_run)
+
+
+@cli.command(help="Run kshift as a daemon, keeping config and caches warm")
+@click.option(
+    "-s",
+    "--schedule",
+    is_flag=True,
+    help="Apply themes at their times from the daemon, instead of systemd",
+)
+def daemon(schedule):
+    if kshift_daemon.running():
+        print(
+            f"kshift daemon already running on {kshift_daemon.socket_path()}")
+        return
+
+    reload_config()
+
+    # Both systemd and the scheduler would apply every switch
+    if schedule:
+        timers = sorted(f.name for f in get_config().systemd_loc.glob(
+            f"{kshift_systemd.UNIT_PREFIX}*.timer"))
+        statuses = kshift_systemd.Systemctl().timers(timers)
+        if any(status.enabled for status in statuses.values()):
+            print("Error: kshift timers are enabled in systemd, "
+                  "run `kshift remove` before scheduling from the daemon")
+            sys.exit(1)
+
+    def scheduled_themes():
+        with kshift_daemon.lock:
+            reload_config()
+            return get_config().themes
+
+    # Output goes to a client while it runs a command, so wait for the lock
+    def report(output):
+        with kshift_daemon.lock:
+            print(output, end="", flush=True)
+
+    async def fire(name):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, kshift_daemon.execute,
+                                              apply_scheduled, [name],
+                                              {"SOURCE": "scheduler"})
+        await loop.run_in_executor(None, report, response["output"])
+
+    async def run():
+        tasks = [kshift_daemon.serve(run_in_daemon)]
+        if schedule:
+            tasks.append(Scheduler(scheduled_themes, fire).run())
+
+        await asyncio.gather(*tasks)
+
+    print(f"kshift daemon listening on {kshift_daemon.socket_path()}")
+    try:
+        asyncio.run(run())
+    except RuntimeError as e:
+        print(f"Error: {e}")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
 
 
 @cli.command(help="Display kshift status")
 def status():
+    c = get_config()
     c.status()
 
+    now = datetime.now()
+    timeline = get_timeline(now)
+
+    active = timeline.active(now)
+    if active:
+        print(f"active theme: {active}")
+
+    switch = timeline.next_switch(now)
+    if switch:
+        print(f"next switch: {switch[1]} at {switch[0]:%Y-%m-%d %H:%M}")
+
+
+@cli.command(help="Validate every theme in the configuration")
+def validate():
+    c = get_config()
+    try:
+        c.check()
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+    print(f"Configuration valid: {len(c.themes)} themes checked.")
+
 
 @cli.command(help="Edit the kshift configuration file")
 def config():
     """Edit the configuration file."""
 
-    filepath = c.config_loc
+    filepath = config_path()
     if filepath.exists():
         try:
             # Use xdg-open to open the file in the default editor
@@ -297,16 +496,76 @@ def config():
     is_flag=True,
     help="Print the entire log file",
 )
-def logs(all):
+@click.option("-n",
+              "--lines",
+              default=10,
+              show_default=True,
+              help="Number of lines to print")
+@click.option("-f",
+              "--follow",
+              is_flag=True,
+              help="Keep printing lines as they are logged")
+@click.option("--json",
+              "as_json",
+              is_flag=True,
+              help="Print the logged events as JSON, one per line")
+def logs(all, lines, follow, as_json):
+
+    def show(line):
+        if not as_json:
+            print(line, end="", flush=follow)
+            return
+
+        event = kshift_logs.decode(line)
+        if event:
+            print(json.dumps(event), flush=follow)
+
+    if not as_json:
+        print(f"Log @ {log_file}")
+
+    # Backups are included, so rotation never cuts the output short
+    for line in (kshift_logs.read_all(log_file) if all else kshift_logs.tail(
+            log_file, lines)):
+        show(line)
+
+    if follow:
+        try:
+            for line in kshift_logs.follow(log_file):
+                show(line)
+        except KeyboardInterrupt:
+            pass
 
-    print(f"Log @ {log_file}")
-    with open(log_file, 'r') as f:
-        lines = f.readlines()
-        if not all:
-            lines = lines[-10:]
 
-        for line in lines:
-            print(line, end="")
+@cli.command(help="Show recorded theme applies")
+@click.option("--since",
+              help="Only applies since a time ago, like 7d or 12h, or a date")
+@click.option("-t", "--theme", help="Only applies of this theme")
+@click.option("--source",
+              type=click.Choice(["direct", "systemd", "scheduler"]),
+              help="Only applies started this way")
+@click.option("-s",
+              "--stats",
+              is_flag=True,
+              help="Show the number and latency of applies per theme")
+def history(since, theme, source, stats):
+    if not get_config().history:
+        print("History is off, set `history: true` in kshift.yml to record it")
+        return
+
+    try:
+        since = kshift_history.parse_since(since) if since else None
+    except ValueError:
+        print(f"Error: invalid --since '{since}'")
+        raise SystemExit(1)
+
+    if stats:
+        print(f"{'theme':<12} {'count':>6} {'failed':>6} {'mean':>9} "
+              f"{'max':>9}")
+        for row in kshift_history.stats(since, theme, source):
+            print(row)
+    else:
+        for apply in kshift_history.query(since, theme, source):
+            print(apply)
 
 
 @cli.command(help="List possible themes or attributes")
@@ -324,7 +583,7 @@ def list(attribute):
             print(f"- {a}")
 
     if attribute == "themes":
-        for name, conf in c.themes.items():
+        for name, conf in get_config().themes.items():
             print(f"theme: {name}\n    {conf}\n")
             pass
 
@@ -383,18 +642,25 @@ def list(attribute):
     type=str,
     help="Set a specific wallpaper (overrides theme)",
 )
-def theme(theme, colorscheme, cursortheme, desktop_theme, icontheme,
-          wallpaper):
+@click.option(
+    "-n",
+    "--dry-run",
+    is_flag=True,
+    help="Show what would change without applying anything",
+)
+def theme(theme, colorscheme, cursortheme, desktop_theme, icontheme, wallpaper,
+          dry_run):
+    c = get_config()
 
-    kshift_status = subprocess.run(
-        "systemctl --user is-enabled kshift-startup.timer".split(),
-        stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
+    enabled = kshift_systemd.Systemctl().is_enabled(
+        f"{kshift_systemd.UNIT_PREFIX}startup.timer")
 
     if theme:
         if theme in c.themes:
-            print(f"Applying theme {theme}...")
-            c.themes[theme].kshift()
-            log_theme_change(theme)
+            print(f"{'Planning' if dry_run else 'Applying'} theme {theme}...")
+            results = apply_theme(c.themes[theme], dry_run, theme)
+            if results is not None:
+                log_theme_change(theme, results)
         else:
             print(f"Error: Theme '{theme}' not found in configuration.")
 
@@ -407,9 +673,12 @@ def theme(theme, colorscheme, cursortheme, desktop_theme, icontheme,
             wallpaper=wallpaper,
             desktoptheme=desktop_theme,
         )
-        print("Applying custom theme elements...")
-        custom_theme.kshift()
-        log_element_change(custom_theme)
+        print(
+            f"{'Planning' if dry_run else 'Applying'} custom theme elements..."
+        )
+        results = apply_theme(custom_theme, dry_run)
+        if results is not None:
+            log_element_change(custom_theme, results)
 
     # If there were no arguments
     # Determine which theme should be active, then shift to it
@@ -417,33 +686,41 @@ def theme(theme, colorscheme, cursortheme, desktop_theme, icontheme,
 
         themes = []
 
-        # Add each theme with simple timer, ie not strict OnCalendar time
-        for name, conf in c.themes.items():
-            for t in conf.time:
-                if isinstance(t, datetime) and datetime.now() >= t:
-                    themes.append((name, t))
+        # Add the theme whose time elapsed last
+        now = datetime.now()
+        last = get_timeline(now).last(now)
+        if last:
+            themes.append((last[1], last[0]))
 
         # The last theme activated by timer could be correct active theme
         # Find this last time only if kshift is enabled in systemd
-        if kshift_status == "enabled":
-            last_log_theme = parse_theme_logs(log_file)
-            if last_log_theme:
-                themes.append(last_log_theme)
+        if enabled:
+            applied = last_applied(("systemd", "scheduler"))
+            if applied and applied.theme in c.themes:
+                themes.append((applied.theme, applied.time))
+            elif not applied:
+                last_log_theme = parse_theme_logs(log_file)
+                if last_log_theme:
+                    themes.append(last_log_theme)
 
         # Sort themes such that the one closest to present is last
         # Then change to this theme
         themes = sorted(themes, key=lambda x: x[1])
         if themes:
             curr_theme = themes[-1][0]
-            print(f"Applying theme {curr_theme}...")
+            print(
+                f"{'Planning' if dry_run else 'Applying'} theme {curr_theme}..."
+            )
 
-            c.themes[curr_theme].kshift()
-            log_theme_change(curr_theme)
+            results = apply_theme(c.themes[curr_theme], dry_run, curr_theme)
+            if results is not None:
+                log_theme_change(curr_theme, results)
 
     # Update systemd if installed
-    if kshift_status == "enabled":
+    if enabled and not dry_run:
         write_systemd()
 
 
 if __name__ == "__main__":
-    cli()
+    from kshift.client import main
+    main()
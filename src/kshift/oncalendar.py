@@ -0,0 +1,400 @@
+import calendar
+import re
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time
+from typing import Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pydantic import BaseModel, PrivateAttr
+
+# Years systemd accepts in calendar times
+MIN_YEAR = 1970
+MAX_YEAR = 2199
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+SHORTHANDS = {
+    "minutely": "*-*-* *:*:00",
+    "hourly": "*-*-* *:00:00",
+    "daily": "*-*-* 00:00:00",
+    "monthly": "*-*-01 00:00:00",
+    "weekly": "Mon *-*-* 00:00:00",
+    "yearly": "*-01-01 00:00:00",
+    "annually": "*-01-01 00:00:00",
+    "quarterly": "*-01,04,07,10-01 00:00:00",
+    "semiannually": "*-01,07-01 00:00:00",
+}
+
+# One comma separated part of a field, as (start, stop, repeat). A single
+# value has stop == start, an open repetition like 00/15 has no stop.
+Entry = Tuple[int, Optional[int], Optional[int]]
+
+# Lowest and highest value of each field
+BOUNDS = {
+    "year": (MIN_YEAR, MAX_YEAR),
+    "month": (1, 12),
+    "day": (1, 31),
+    "hour": (0, 23),
+    "minute": (0, 59),
+    "second": (0, 59),
+}
+
+
+def _weekday(name: str) -> int:
+    for i, day in enumerate(WEEKDAYS):
+        full = calendar.day_name[i].lower()
+        if name.lower() in (day.lower(), full):
+            return i
+
+    raise ValueError(f"Invalid weekday: {name}")
+
+
+def _parse_weekdays(text: str) -> List[int]:
+    days = set()
+    for part in text.split(","):
+        first, _, last = part.partition("..")
+        start = _weekday(first)
+        stop = _weekday(last) if last else start
+        if stop < start:
+            raise ValueError(f"Invalid weekday range: {part}")
+
+        days.update(range(start, stop + 1))
+
+    return sorted(days)
+
+
+def _parse_field(text: str, field: str) -> Optional[List[Entry]]:
+    """Parse one field, None meaning any value."""
+    if text == "*":
+        return None
+
+    lo, hi = BOUNDS[field]
+    entries = set()
+
+    for part in text.split(","):
+        r = re.fullmatch(r"(\d+)(?:\.\.(\d+))?(?:/(\d+))?", part)
+        if not r:
+            raise ValueError(f"Invalid {field}: {part}")
+
+        start = int(r.group(1))
+        stop = int(r.group(2)) if r.group(2) else None
+        repeat = int(r.group(3)) if r.group(3) else None
+
+        # Two digit years, like systemd
+        if field == "year" and len(r.group(1)) == 2:
+            start += 1900 if start >= 70 else 2000
+
+        if stop is None and repeat is None:
+            stop = start
+
+        if not lo <= start <= hi or (stop is not None
+                                     and not start <= stop <= hi):
+            raise ValueError(f"Invalid {field}: {part}")
+        if repeat == 0:
+            raise ValueError(f"Invalid {field} repetition: {part}")
+
+        entries.add((start, stop, repeat))
+
+    return sorted(entries,
+                  key=lambda e: (e[0], e[1] is None, e[1] or 0, e[2] or 0))
+
+
+def _format_field(entries: Optional[List[Entry]], width: int = 2) -> str:
+    if entries is None:
+        return "*"
+
+    parts = []
+    for start, stop, repeat in entries:
+        part = f"{start:0{width}d}"
+        if stop is not None and (stop != start or repeat):
+            part += f"..{stop:0{width}d}"
+        if repeat:
+            part += f"/{repeat}"
+        parts.append(part)
+
+    return ",".join(parts)
+
+
+def _matches(entries: Optional[List[Entry]], value: int, hi: int) -> bool:
+    if entries is None:
+        return True
+
+    for start, stop, repeat in entries:
+        stop = hi if stop is None else stop
+        if start <= value <= stop and (value - start) % (repeat or 1) == 0:
+            return True
+
+    return False
+
+
+# Matches a day counted from the end of the month, 1 being the last day.
+# Repetitions count towards the end, ~07/1 being the last seven days.
+def _matches_from_end(entries: Optional[List[Entry]], value: int) -> bool:
+    if entries is None:
+        return True
+
+    for start, stop, repeat in entries:
+        stop = 1 if stop is None else stop
+        if (min(start, stop) <= value <= max(start, stop)
+                and (start - value) % (repeat or 1) == 0):
+            return True
+
+    return False
+
+
+class CalendarSpec(BaseModel):
+    """A parsed systemd OnCalendar time, see systemd.time(7)."""
+
+    # Weekday numbers, Monday being 0, or None for any day
+    weekdays: Optional[List[int]] = None
+
+    year: Optional[List[Entry]] = None
+    month: Optional[List[Entry]] = None
+    day: Optional[List[Entry]] = None
+    hour: Optional[List[Entry]] = None
+    minute: Optional[List[Entry]] = None
+    second: Optional[List[Entry]] = None
+
+    # Days count back from the last day of the month, as in *-02~03
+    end_of_month: bool = False
+
+    timezone: Optional[str] = None
+
+    # Sorted matching hours, minutes and seconds, built on first search
+    _clock: Optional[Tuple[List[int], List[int],
+                           List[int]]] = PrivateAttr(None)
+
+    @classmethod
+    def parse(cls, text: str) -> "CalendarSpec":
+        """Parse an OnCalendar time, raising ValueError if it is invalid.
+
+        Fractional seconds and @epoch timestamps are not supported.
+        """
+        words = SHORTHANDS.get(text.strip().lower(), text).split()
+        if not words:
+            raise ValueError("Empty calendar time")
+
+        fields = {}
+
+        if words and re.fullmatch(r"[A-Za-z]+(\.\.[A-Za-z]+)?(,.+)?",
+                                  words[0]) and "/" not in words[0]:
+            try:
+                fields["weekdays"] = _parse_weekdays(words[0])
+                words.pop(0)
+            except ValueError:
+                if len(words) == 1:
+                    raise
+
+        if words and ("-" in words[0] or "~" in words[0]):
+            r = re.fullmatch(r"(?:([^-~]+)-)?([^-~]+)([-~])([^-~]+)",
+                             words.pop(0))
+            if not r:
+                raise ValueError(f"Invalid date in calendar time: {text}")
+
+            fields["year"] = _parse_field(r.group(1) or "*", "year")
+            fields["month"] = _parse_field(r.group(2), "month")
+            fields["day"] = _parse_field(r.group(4), "day")
+            fields["end_of_month"] = r.group(3) == "~"
+
+        if words and ":" in words[0]:
+            parts = words.pop(0).split(":")
+            if len(parts) not in (2, 3):
+                raise ValueError(f"Invalid time in calendar time: {text}")
+            if len(parts) == 2:
+                parts.append("00")
+
+            for field, part in zip(("hour", "minute", "second"), parts):
+                fields[field] = _parse_field(part, field)
+        else:
+            fields.update(hour=[(0, 0, None)],
+                          minute=[(0, 0, None)],
+                          second=[(0, 0, None)])
+
+        if words:
+            zone = words.pop(0)
+            try:
+                ZoneInfo(zone)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Invalid calendar time: {text}")
+            fields["timezone"] = zone
+
+        if words:
+            raise ValueError(f"Invalid calendar time: {text}")
+
+        # Every weekday is the same as any weekday
+        if fields.get("weekdays") == list(range(7)):
+            fields["weekdays"] = None
+
+        return cls(**fields)
+
+    def __str__(self) -> str:
+        """The normalized form, as systemd-analyze calendar prints it."""
+        words = []
+
+        if self.weekdays is not None:
+            runs = []
+            for day in self.weekdays:
+                if runs and runs[-1][-1] == day - 1:
+                    runs[-1].append(day)
+                else:
+                    runs.append([day])
+
+            parts = []
+            for run in runs:
+                if len(run) >= 3:
+                    parts.append(f"{WEEKDAYS[run[0]]}..{WEEKDAYS[run[-1]]}")
+                else:
+                    parts += [WEEKDAYS[d] for d in run]
+            words.append(",".join(parts))
+
+        words.append(f"{_format_field(self.year, 4)}-"
+                     f"{_format_field(self.month)}"
+                     f"{'~' if self.end_of_month else '-'}"
+                     f"{_format_field(self.day)}")
+        words.append(f"{_format_field(self.hour)}:"
+                     f"{_format_field(self.minute)}:"
+                     f"{_format_field(self.second)}")
+
+        if self.timezone:
+            words.append(self.timezone)
+
+        return " ".join(words)
+
+    def matches_date(self, day: date) -> bool:
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return False
+
+        last = calendar.monthrange(day.year, day.month)[1]
+        if self.end_of_month:
+            if not _matches_from_end(self.day, last - day.day + 1):
+                return False
+        elif not _matches(self.day, day.day, last):
+            return False
+
+        return (_matches(self.year, day.year, MAX_YEAR)
+                and _matches(self.month, day.month, 12))
+
+    def _clock_values(self) -> Tuple[List[int], List[int], List[int]]:
+        if self._clock is None:
+            self._clock = ([
+                h for h in range(24) if _matches(self.hour, h, 23)
+            ], [m for m in range(60) if _matches(self.minute, m, 59)
+                ], [s for s in range(60) if _matches(self.second, s, 59)])
+
+        return self._clock
+
+    def _next_time(self, after: time) -> Optional[time]:
+        """First matching time of day after ``after``."""
+        hours, minutes, seconds = self._clock_values()
+
+        if after.hour in hours:
+            if after.minute in minutes:
+                i = bisect_right(seconds, after.second)
+                if i < len(seconds):
+                    return time(after.hour, after.minute, seconds[i])
+
+            i = bisect_right(minutes, after.minute)
+            if i < len(minutes):
+                return time(after.hour, minutes[i], seconds[0])
+
+        i = bisect_right(hours, after.hour)
+        if i < len(hours):
+            return time(hours[i], minutes[0], seconds[0])
+
+        return None
+
+    def _previous_time(self, before: time) -> Optional[time]:
+        """Last matching time of day at or before ``before``."""
+        hours, minutes, seconds = self._clock_values()
+
+        if before.hour in hours:
+            if before.minute in minutes:
+                i = bisect_right(seconds, before.second)
+                if i:
+                    return time(before.hour, before.minute, seconds[i - 1])
+
+            i = bisect_left(minutes, before.minute)
+            if i:
+                return time(before.hour, minutes[i - 1], seconds[-1])
+
+        i = bisect_left(hours, before.hour)
+        if i:
+            return time(hours[i - 1], minutes[-1], seconds[-1])
+
+        return None
+
+    def _dates(self, start: date, reverse: bool) -> Iterator[date]:
+        step = -1 if reverse else 1
+        years = range(start.year, (MIN_YEAR - 1) if reverse else
+                      (MAX_YEAR + 1), step)
+
+        for year in years:
+            if not _matches(self.year, year, MAX_YEAR):
+                continue
+
+            months = range(12, 0, -1) if reverse else range(1, 13)
+            for month in months:
+                if (year, month) < (start.year, start.month) and not reverse:
+                    continue
+                if (year, month) > (start.year, start.month) and reverse:
+                    continue
+                if not _matches(self.month, month, 12):
+                    continue
+
+                last = calendar.monthrange(year, month)[1]
+                days = range(last, 0, -1) if reverse else range(1, last + 1)
+                for d in days:
+                    day = date(year, month, d)
+                    if (day < start and not reverse) or (day > start
+                                                         and reverse):
+                        continue
+                    if self.matches_date(day):
+                        yield day
+
+    def _search(self, bound: datetime, reverse: bool) -> Optional[datetime]:
+        zone = ZoneInfo(self.timezone) if self.timezone else None
+        if zone:
+            bound = bound.astimezone(zone).replace(tzinfo=None)
+
+        hours, minutes, seconds = self._clock_values()
+        if not (hours and minutes and seconds):
+            return None
+
+        # Only the bound's own day starts mid-day, later days (earlier ones
+        # in reverse) start from their first (last) matching time
+        first = time(hours[0], minutes[0], seconds[0])
+        last = time(hours[-1], minutes[-1], seconds[-1])
+
+        for day in self._dates(bound.date(), reverse):
+            if day != bound.date():
+                at = last if reverse else first
+            elif reverse:
+                at = self._previous_time(bound.time())
+            else:
+                at = self._next_time(bound.time())
+
+            if at is None:
+                continue
+
+            found = datetime.combine(day, at)
+            if zone:
+                # Back to naive local time
+                found = found.replace(tzinfo=zone).astimezone().replace(
+                    tzinfo=None)
+            return found
+
+        return None
+
+    def next_elapse(self, after: datetime) -> Optional[datetime]:
+        """First elapse after ``after``, or None if it never elapses again."""
+        return self._search(after.replace(microsecond=0), reverse=False)
+
+    def previous_elapse(self, before: datetime) -> Optional[datetime]:
+        """Last elapse at or before ``before``, or None if there is none."""
+        return self._search(before.replace(microsecond=0), reverse=True)
+
+
+def normalize(text: str) -> str:
+    """Normalized form of an OnCalendar time, raising ValueError if invalid."""
+    return str(CalendarSpec.parse(text))
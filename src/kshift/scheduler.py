@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from kshift.oncalendar import CalendarSpec
+from kshift.theme import Theme
+from kshift.utils import calendar_next_elapse
+
+# Longest single sleep. The wall clock is checked after every sleep, which
+# notices clock changes and resume from suspend within one tick.
+TICK = 60
+
+# Seconds the wall clock may drift from the monotonic clock between two
+# checks before it counts as a jump
+JUMP_TOLERANCE = 5
+
+
+def next_fire(time: Union[str, datetime],
+              after: datetime) -> Optional[datetime]:
+    """First time a theme trigger fires after ``after``.
+
+    Resolved HH:MM and sunrise/sunset times repeat daily, other strings are
+    OnCalendar times. Returns None for a time that never elapses again.
+    """
+    if isinstance(time, datetime):
+        fire = datetime.combine(after.date(), time.time())
+        if fire <= after:
+            fire += timedelta(days=1)
+        return fire
+
+    try:
+        return CalendarSpec.parse(time).next_elapse(after)
+    except ValueError:
+        # Forms only systemd understands, such as fractional seconds
+        return calendar_next_elapse(time, after)
+
+
+class Scheduler:
+    """Fires themes at their configured times from inside one process.
+
+    ``themes`` returns the current themes and is polled every tick, a new
+    dict, such as one from a reloaded config, reschedules everything.
+    ``fire`` applies a theme by name.
+    """
+
+    def __init__(self, themes: Callable[[], Dict[str, Theme]],
+                 fire: Callable[[str], Awaitable[None]]):
+        self.themes = themes
+        self.fire = fire
+
+        # Heap of (fire time, theme name, index into the theme's times)
+        self.events: List[Tuple[datetime, str, int]] = []
+        self._themes: Optional[Dict[str, Theme]] = None
+
+    def schedule(self, themes: Dict[str, Theme], now: datetime):
+        """Rebuild the event heap from every theme trigger."""
+        self._themes = themes
+        self.events = []
+
+        for name, theme in themes.items():
+            for i, time in enumerate(theme.time):
+                fire = next_fire(time, now)
+                if fire:
+                    self.events.append((fire, name, i))
+
+        heapq.heapify(self.events)
+
+    def advance(self, themes: Dict[str, Theme], now: datetime,
+                jumped: bool) -> Optional[str]:
+        """Consume the events due at ``now`` and schedule their next firing.
+
+        Returns the theme to apply. When several events are due, after a
+        suspend or clock jump, only the latest matters.
+        """
+        due = []
+        while self.events and self.events[0][0] <= now:
+            due.append(heapq.heappop(self.events))
+
+        # A reloaded config reschedules, but events due under the old one,
+        # like the morning switch after an overnight suspend, still fire
+        if themes is not self._themes:
+            self.schedule(themes, now)
+            due = [event for event in due if event[1] in themes]
+            return due[-1][1] if due else None
+
+        for _, name, i in due:
+            fire = next_fire(themes[name].time[i], now)
+            if fire:
+                heapq.heappush(self.events, (fire, name, i))
+
+        # Times computed before a jump are off by the size of the jump
+        if jumped:
+            self.schedule(themes, now)
+
+        return due[-1][1] if due else None
+
+    def delay(self, now: datetime) -> float:
+        """Seconds to sleep until the next event, at most one tick."""
+        if not self.events:
+            return TICK
+
+        until = (self.events[0][0] - now).total_seconds()
+        return min(max(until, 0), TICK)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_wall, last_mono = datetime.now(), loop.time()
+
+        while True:
+            themes = await loop.run_in_executor(None, self.themes)
+
+            now = datetime.now()
+            drift = (now - last_wall).total_seconds() - (loop.time() -
+                                                         last_mono)
+            jumped = abs(drift) > JUMP_TOLERANCE
+
+            name = await loop.run_in_executor(None, self.advance, themes, now,
+                                              jumped)
+            if name:
+                await self.fire(name)
+
+            last_wall, last_mono = datetime.now(), loop.time()
+            await asyncio.sleep(self.delay(last_wall))
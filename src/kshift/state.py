@@ -0,0 +1,158 @@
+import configparser
+import json
+import os
+import re
+import threading
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+
+from kshift.utils import atomic_write, xdg_cache_home, xdg_config_home
+
+# Parsed KDE config files, keyed by path and invalidated by mtime and size.
+# Missing files are remembered as missing until they appear.
+_kconfigs: Dict[Path, Tuple[Optional[Tuple[int, int]],
+                            configparser.ConfigParser]] = {}
+_lock = threading.Lock()
+
+
+def read_kconfig(path: Path) -> configparser.ConfigParser:
+    """Parse a KDE config file, at most once while it is unchanged.
+
+    The parser is shared between callers and must not be modified.
+    """
+    try:
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        stamp = None
+
+    with _lock:
+        cached = _kconfigs.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        # KDE allows duplicate keys and sections, and uses % literally
+        config = configparser.ConfigParser(interpolation=None, strict=False)
+        config.optionxform = str
+
+        try:
+            config.read(path)
+        except configparser.Error:
+            pass  # A malformed file reads as empty, like a missing one
+
+        _kconfigs[path] = (stamp, config)
+
+        return config
+
+
+def kconfig_value(filename: str, section: str, key: str) -> Optional[str]:
+    config = read_kconfig(xdg_config_home() / filename)
+    return config.get(section, key, fallback=None)
+
+
+# Plasma's defaults, in effect while the config files leave a value unset
+PLASMA_DEFAULTS = {
+    "colorscheme": "BreezeLight",
+    "cursortheme": "breeze_cursors",
+    "desktoptheme": "default",
+    "icontheme": "breeze",
+}
+
+
+class DesktopState(BaseModel):
+    """The attribute values currently active in the Plasma session."""
+    colorscheme: Optional[str] = PLASMA_DEFAULTS["colorscheme"]
+    cursortheme: Optional[str] = PLASMA_DEFAULTS["cursortheme"]
+    desktoptheme: Optional[str] = PLASMA_DEFAULTS["desktoptheme"]
+    icontheme: Optional[str] = PLASMA_DEFAULTS["icontheme"]
+
+    # Wallpaper image path for each desktop containment id
+    wallpapers: Dict[str, str] = {}
+
+    @classmethod
+    def read(cls) -> "DesktopState":
+        kdeglobals = read_kconfig(xdg_config_home() / "kdeglobals")
+
+        wallpapers = {}
+        appletsrc = read_kconfig(xdg_config_home() /
+                                 "plasma-org.kde.plasma.desktop-appletsrc")
+        for section in appletsrc.sections():
+            match = re.fullmatch(
+                r"Containments\]\[(\d+)\]\[Wallpaper\]\[org\.kde\.image\]\[General",
+                section)
+            image = appletsrc.get(section, "Image", fallback=None)
+            if match and image:
+                wallpapers[match.group(1)] = image.replace("file://", "")
+
+        values = {
+            "colorscheme": kdeglobals.get("General",
+                                          "ColorScheme",
+                                          fallback=None),
+            "cursortheme": kconfig_value("kcminputrc", "Mouse", "cursorTheme"),
+            "desktoptheme": kconfig_value("plasmarc", "Theme", "name"),
+            "icontheme": kdeglobals.get("Icons", "Theme", fallback=None),
+        }
+
+        values = {k: v for k, v in values.items() if v is not None}
+
+        return cls(wallpapers=wallpapers, **values)
+
+    @property
+    def wallpaper(self) -> Optional[str]:
+        """The wallpaper, if every desktop shows the same one."""
+        images = set(self.wallpapers.values())
+        return images.pop() if len(images) == 1 else None
+
+    def get(self, name: str) -> Optional[str]:
+        """Current value of the attribute called ``name``."""
+        return getattr(self, name)
+
+
+def applied_file() -> Path:
+    return xdg_cache_home() / "kshift" / "applied.json"
+
+
+class AppliedTheme(BaseModel):
+    """A theme kshift applied, and the attribute values it set."""
+    theme: str
+    source: str
+    time: datetime
+    attributes: Dict[str, str] = {}
+
+
+def read_applied() -> Dict[str, AppliedTheme]:
+    """The last theme applied from each source, such as systemd."""
+    try:
+        with open(applied_file(), "r") as file:
+            data = json.load(file)
+
+        return {
+            source: AppliedTheme(**entry)
+            for source, entry in data.items()
+        }
+    except (OSError, ValueError, AttributeError, TypeError):
+        return {}
+
+
+def last_applied(sources: Iterable[str]) -> Optional[AppliedTheme]:
+    """The theme applied last from any of ``sources``."""
+    applied = [a for s, a in read_applied().items() if s in sources]
+    return max(applied, key=lambda a: a.time) if applied else None
+
+
+def record_applied(applied: AppliedTheme):
+    with _lock:
+        data = {
+            source: entry.model_dump(mode="json")
+            for source, entry in read_applied().items()
+        }
+        data[applied.source] = applied.model_dump(mode="json")
+
+        try:
+            atomic_write(applied_file(), json.dumps(data))
+        except OSError:
+            pass  # The log still records the change
@@ -0,0 +1,256 @@
+import calendar
+import math
+import mmap
+import struct
+import threading
+
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from kshift.cache import cache_dir
+from kshift.utils import atomic_write
+
+# Zenith angle of the sun at each pair of morning and evening events, in
+# degrees. Sunrise and sunset allow for refraction and the sun's radius.
+ZENITHS = {
+    ("sunrise", "sunset"): 90.833,
+    ("civil_dawn", "civil_dusk"): 96.0,
+    ("nautical_dawn", "nautical_dusk"): 102.0,
+}
+
+
+class SunTimes(BaseModel):
+    """Sun events of one day in local time.
+
+    Events are None when the sun never reaches their angle that day, as in
+    polar summer and winter.
+    """
+    nautical_dawn: Optional[datetime] = None
+    civil_dawn: Optional[datetime] = None
+    sunrise: Optional[datetime] = None
+    sunset: Optional[datetime] = None
+    civil_dusk: Optional[datetime] = None
+    nautical_dusk: Optional[datetime] = None
+
+
+def _julian_century(when: datetime) -> float:
+    julian_day = when.timestamp() / 86400 + 2440587.5
+    return (julian_day - 2451545) / 36525
+
+
+def _solar_position(t: float):
+    """The sun's declination in degrees and the equation of time in minutes.
+
+    ``t`` is in Julian centuries since J2000, as in the NOAA solar equations.
+    """
+    mean_long = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+    mean_anom = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    eccent = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    m = math.radians(mean_anom)
+    center = (math.sin(m) * (1.914602 - t *
+                             (0.004817 + 0.000014 * t)) + math.sin(2 * m) *
+              (0.019993 - 0.000101 * t) + math.sin(3 * m) * 0.000289)
+
+    omega = math.radians(125.04 - 1934.136 * t)
+    app_long = mean_long + center - 0.00569 - 0.00478 * math.sin(omega)
+
+    mean_obliq = 23 + (26 + (21.448 - t *
+                             (46.815 + t *
+                              (0.00059 - t * 0.001813))) / 60) / 60
+    obliq = math.radians(mean_obliq + 0.00256 * math.cos(omega))
+
+    declination = math.asin(math.sin(obliq) * math.sin(math.radians(app_long)))
+
+    y = math.tan(obliq / 2)**2
+    l0 = math.radians(mean_long)
+    eq_of_time = 4 * math.degrees(y * math.sin(2 * l0) -
+                                  2 * eccent * math.sin(m) + 4 * eccent * y *
+                                  math.sin(m) * math.cos(2 * l0) -
+                                  0.5 * y * y * math.sin(4 * l0) -
+                                  1.25 * eccent * eccent * math.sin(2 * m))
+
+    return math.degrees(declination), eq_of_time
+
+
+# Time of a sun event in UTC
+def _event(latitude: float, longitude: float, day: date, zenith: float,
+           rising: bool) -> Optional[datetime]:
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+    # Start from solar noon, then refine at the event's own time
+    minutes = 720 - 4 * longitude
+    for _ in range(3):
+        declination, eq_of_time = _solar_position(
+            _julian_century(midnight + timedelta(minutes=minutes)))
+
+        lat, decl = math.radians(latitude), math.radians(declination)
+        cos_hour_angle = (math.cos(math.radians(zenith)) /
+                          (math.cos(lat) * math.cos(decl)) -
+                          math.tan(lat) * math.tan(decl))
+        if not -1 <= cos_hour_angle <= 1:
+            return None
+
+        hour_angle = math.degrees(math.acos(cos_hour_angle))
+        noon = 720 - 4 * longitude - eq_of_time
+        minutes = noon - 4 * hour_angle if rising else noon + 4 * hour_angle
+
+    return (midnight + timedelta(minutes=minutes)).replace(microsecond=0)
+
+
+def _local(utc: Optional[datetime]) -> Optional[datetime]:
+    return utc.astimezone().replace(tzinfo=None) if utc else None
+
+
+def sun_times(latitude: float, longitude: float, day: date) -> SunTimes:
+    """Sunrise, sunset and twilight at a location, computed offline."""
+    times = {}
+    for (dawn, dusk), zenith in ZENITHS.items():
+        times[dawn] = _local(
+            _event(latitude, longitude, day, zenith, rising=True))
+        times[dusk] = _local(
+            _event(latitude, longitude, day, zenith, rising=False))
+
+    return SunTimes(**times)
+
+
+###################################
+# Year table
+###################################
+
+SUN_TABLE_VERSION = 1
+
+# Magic, version, latitude, longitude and year, then one record per day of
+# the year holding each event as UTC epoch seconds, 0 for no event
+HEADER = struct.Struct("<4sHddi")
+RECORD = struct.Struct(f"<{len(SunTimes.model_fields)}q")
+MAGIC = b"KSUN"
+
+
+def sun_table_file(latitude: float, longitude: float, year: int) -> Path:
+    return cache_dir() / f"sun-{latitude:.4f},{longitude:.4f}-{year}.bin"
+
+
+class SunTable:
+    """A year of sun times for one location, memory-mapped from the cache.
+
+    Computed once per location and year, after which looking up a day reads
+    one fixed-width record.
+    """
+
+    def __init__(self, latitude: float, longitude: float, year: int):
+        self.year = year
+        path = sun_table_file(latitude, longitude, year)
+        header = (MAGIC, SUN_TABLE_VERSION, latitude, longitude, year)
+
+        try:
+            self.map = self._open(path, header)
+        except (OSError, ValueError, struct.error):
+            atomic_write(path, self.build(latitude, longitude, year))
+            self.map = self._open(path, header)
+
+    @staticmethod
+    def _open(path: Path, header: tuple) -> mmap.mmap:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        days = 366 if calendar.isleap(header[-1]) else 365
+        if (HEADER.unpack_from(mapped) != header
+                or len(mapped) != HEADER.size + days * RECORD.size):
+            mapped.close()
+            raise ValueError(f"Stale sun table {path}")
+
+        return mapped
+
+    @staticmethod
+    def build(latitude: float, longitude: float, year: int) -> bytes:
+        records = [
+            HEADER.pack(MAGIC, SUN_TABLE_VERSION, latitude, longitude, year)
+        ]
+
+        day = date(year, 1, 1)
+        while day.year == year:
+            events = {}
+            for (dawn, dusk), zenith in ZENITHS.items():
+                events[dawn] = _event(latitude, longitude, day, zenith, True)
+                events[dusk] = _event(latitude, longitude, day, zenith, False)
+
+            records.append(
+                RECORD.pack(
+                    *(int(events[name].timestamp()) if events[name] else 0
+                      for name in SunTimes.model_fields)))
+            day += timedelta(days=1)
+
+        return b"".join(records)
+
+    def get(self, day: date) -> SunTimes:
+        if day.year != self.year:
+            raise ValueError(f"{day} is not in the {self.year} sun table")
+
+        offset = HEADER.size + (day.timetuple().tm_yday - 1) * RECORD.size
+        stamps = RECORD.unpack_from(self.map, offset)
+
+        return SunTimes(
+            **{
+                name: datetime.fromtimestamp(stamp) if stamp else None
+                for name, stamp in zip(SunTimes.model_fields, stamps)
+            })
+
+
+_tables: Dict[Tuple[float, float, int], SunTable] = {}
+_lock = threading.Lock()
+
+
+def sun_times_on(latitude: float, longitude: float, day: date) -> SunTimes:
+    """Sun times for any day, from the location's year table."""
+    key = (latitude, longitude, day.year)
+
+    with _lock:
+        if key not in _tables:
+            try:
+                _tables[key] = SunTable(*key)
+            except OSError:
+                # No writable cache, compute just this day
+                return sun_times(latitude, longitude, day)
+
+    return _tables[key].get(day)
+
+
+T = TypeVar("T")
+
+
+class SunResolver:
+    """Memoizes sun data per location and date for the whole process.
+
+    Lookups hold the resolver's lock, so concurrent callers wait for one
+    lookup instead of each running their own. ``fetches`` counts the lookups
+    that ran.
+    """
+
+    def __init__(self):
+        self.fetches = 0
+        self._resolved: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, latitude: float, longitude: float, day: date,
+                source: str, lookup: Callable[[], T]) -> T:
+        key = (latitude, longitude, day, source)
+
+        with self._lock:
+            if key not in self._resolved:
+                self._resolved[key] = lookup()
+                self.fetches += 1
+
+            return self._resolved[key]
+
+    def invalidate(self,
+                   latitude: Optional[float] = None,
+                   longitude: Optional[float] = None):
+        """Forget the sun data of one location, or of every location."""
+        with self._lock:
+            for key in list(self._resolved):
+                if latitude is None or key[:2] == (latitude, longitude):
+                    del self._resolved[key]
@@ -0,0 +1,245 @@
+import difflib
+import hashlib
+import subprocess
+
+from datetime import datetime
+from importlib.resources import files
+from pathlib import Path
+from string import Template
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel
+
+from kshift.theme import Theme
+from kshift.utils import atomic_write
+
+UNIT_PREFIX = "kshift-"
+
+
+def load_templates(directory: Path) -> Dict[str, Template]:
+    """The timer and service templates, falling back to the packaged ones."""
+    templates = {}
+    for kind in ("timer", "service"):
+        path = directory / f"template.{kind}"
+        if not path.exists():
+            path = files("kshift") / "templates" / f"template.{kind}"
+
+        templates[kind] = Template(path.read_text())
+
+    return templates
+
+
+def timer_times(theme: Theme) -> List[str]:
+    # Datetimes were HH:MM or sunrise/sunset times, strings are verified
+    # OnCalendar times
+    return [
+        t.strftime("%H:%M") if isinstance(t, datetime) else t
+        for t in theme.time
+    ]
+
+
+def render_units(themes: Dict[str, Theme], templates: Dict[str, Template],
+                 kshift_path: str) -> Dict[str, str]:
+    """Every kshift unit file for the themes, by file name."""
+    units = {}
+
+    for name, theme in themes.items():
+        others = " ".join(f"{UNIT_PREFIX}{other}.service" for other in themes
+                          if other != name)
+
+        calendar_times = "".join(f"OnCalendar={t}\n"
+                                 for t in timer_times(theme))
+
+        # Cannot have timer with no timer action
+        if calendar_times:
+            units[f"{UNIT_PREFIX}{name}.timer"] = templates[
+                "timer"].substitute(
+                    description=f"kshift timer for theme {name}",
+                    unit_options=f"After={others}",
+                    timer_action=f"{calendar_times}\nPersistent=true")
+
+        units[f"{UNIT_PREFIX}{name}.service"] = templates[
+            "service"].substitute(
+                description=f"kshift service for theme {name}",
+                command=f"{kshift_path} theme {name}")
+
+    units[f"{UNIT_PREFIX}startup.timer"] = templates["timer"].substitute(
+        description="kshift startup timer",
+        unit_options="",
+        timer_action="OnStartupSec=5")
+    units[f"{UNIT_PREFIX}startup.service"] = templates["service"].substitute(
+        description="kshift startup service", command=kshift_path)
+
+    return units
+
+
+def digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class UnitChange(BaseModel):
+    """A unit file to write or remove to match the config."""
+    name: str
+    action: Literal["write", "remove"]
+    content: str = ""
+    diff: str = ""
+
+    @property
+    def is_timer(self) -> bool:
+        return self.name.endswith(".timer")
+
+
+def plan_units(units: Dict[str, str], directory: Path) -> List[UnitChange]:
+    """The writes and removals that make ``directory`` match ``units``.
+
+    Units whose content hash already matches the file are left out.
+    """
+    changes = []
+
+    for name, content in sorted(units.items()):
+        path = directory / name
+        old = path.read_bytes() if path.exists() else b""
+        if digest(old) == digest(content.encode()):
+            continue
+
+        diff = difflib.unified_diff(old.decode().splitlines(keepends=True),
+                                    content.splitlines(keepends=True),
+                                    fromfile=str(path) if old else "/dev/null",
+                                    tofile=str(path))
+        changes.append(
+            UnitChange(name=name,
+                       action="write",
+                       content=content,
+                       diff="".join(diff)))
+
+    # Units of themes that were removed or lost their times
+    if directory.exists():
+        for path in sorted(directory.glob(f"{UNIT_PREFIX}*")):
+            if path.suffix in (".timer",
+                               ".service") and path.name not in units:
+                changes.append(
+                    UnitChange(name=path.name,
+                               action="remove",
+                               diff=f"removed {path}\n"))
+
+    return changes
+
+
+def apply_units(changes: List[UnitChange], directory: Path):
+    for change in changes:
+        path = directory / change.name
+        if change.action == "write":
+            atomic_write(path, change.content)
+        else:
+            path.unlink(missing_ok=True)
+
+
+class TimerStatus(BaseModel):
+    """What systemd reports about a timer."""
+    unit: str
+    enabled: bool
+    active: bool
+    last: Optional[datetime] = None
+    next: Optional[datetime] = None
+
+
+def _timestamp(value: str) -> Optional[datetime]:
+    # Printed as @<seconds> with --timestamp=unix, empty or n/a when unset
+    if value.startswith("@"):
+        return datetime.fromtimestamp(int(value[1:]))
+
+    # Before systemd 251 only as local time, "Sat 2024-03-09 10:00:00 CET"
+    parts = value.split()
+    if len(parts) < 3:
+        return None
+
+    try:
+        return datetime.strptime(f"{parts[1]} {parts[2]}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+class Systemctl:
+    """Runs ``systemctl --user`` for many units at once.
+
+    Any executable called systemctl on PATH will do, including a fake one
+    in tests.
+    """
+
+    def __init__(self, command: str = "systemctl"):
+        self.command = command
+
+    def run(self, *args: str) -> Optional[subprocess.CompletedProcess]:
+        """Run a systemctl command, or return None without systemctl."""
+        try:
+            return subprocess.run([self.command, "--user", *args],
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL,
+                                  text=True)
+        except OSError:
+            return None
+
+    def show(self,
+             units: List[str],
+             properties: List[str],
+             timestamps: bool = False) -> Dict[str, Dict[str, str]]:
+        """Properties of every unit, from one ``systemctl show``."""
+        if not units:
+            return {}
+
+        args = [f"--property=Id,{','.join(properties)}", *units]
+        process = None
+        if timestamps:
+            process = self.run("show", "--timestamp=unix", *args)
+
+        # systemd before 251 rejects --timestamp
+        if process is None or process.returncode != 0:
+            process = self.run("show", *args)
+        if process is None:
+            return {}
+
+        # One block of Key=Value lines per unit, separated by blank lines
+        shown = {}
+        for block in process.stdout.split("\n\n"):
+            values = dict(
+                line.split("=", 1) for line in block.splitlines()
+                if "=" in line)
+            if "Id" in values:
+                shown[values["Id"]] = values
+
+        return shown
+
+    def timers(self, units: List[str]) -> Dict[str, TimerStatus]:
+        properties = [
+            "UnitFileState", "ActiveState", "LastTriggerUSec",
+            "NextElapseUSecRealtime"
+        ]
+        shown = self.show(units, properties, timestamps=True)
+
+        return {
+            unit:
+            TimerStatus(unit=unit,
+                        enabled=values.get("UnitFileState") == "enabled",
+                        active=values.get("ActiveState") == "active",
+                        last=_timestamp(values.get("LastTriggerUSec", "")),
+                        next=_timestamp(
+                            values.get("NextElapseUSecRealtime", "")))
+            for unit, values in shown.items()
+        }
+
+    def is_enabled(self, unit: str) -> bool:
+        shown = self.show([unit], ["UnitFileState"])
+        return shown.get(unit, {}).get("UnitFileState") == "enabled"
+
+    def daemon_reload(self):
+        self.run("daemon-reload")
+
+    def enable(self, units: List[str]):
+        """Enable and start units."""
+        if units:
+            self.run("enable", "--now", *units)
+
+    def disable(self, units: List[str]):
+        """Disable and stop units."""
+        if units:
+            self.run("disable", "--now", *units)
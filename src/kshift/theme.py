@@ -1,34 +1,73 @@
 from datetime import datetime, timedelta
-import os
 import re
 import subprocess
-import configparser
+
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 
 from pydantic import BaseModel, field_validator, model_validator
-from typing import Optional, Union, List, Tuple, ClassVar
+from typing import Optional, Union, List, Tuple, ClassVar, Dict, Iterable
+
+from kshift import inventory
+from kshift.apply import (COMMAND_TIMEOUT, Plan, Step, StepResult, run_step,
+                          run_steps)
+from kshift.cache import cached_inventory
+from kshift.inventory import icon_dirs
+from kshift.state import DesktopState
+from kshift.utils import xdg_config_home, xdg_data_dirs
 
 
 class BaseAttribute(BaseModel):
     """Abstract base class for attribute configurations."""
     val: str
 
+    name: ClassVar[str] = ""
     command: ClassVar[str] = ""
 
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
-    def apply(self):
-        if self.val and self.val != self.current:
-            subprocess.run([self.command, self.val])
+    # Source mtimes the inventory was read at, see cached_inventory
+    inventory_stamps: ClassVar[Optional[Dict[str, Optional[int]]]] = None
+
+    # Strict mode validates against the inventory as soon as the attribute is
+    # built. Otherwise validation waits for check(), run before applying.
+    strict: ClassVar[bool] = False
+
+    # Inventory backends in order of preference, see fetch_backends()
+    backends: ClassVar[List[str]] = ["native", "cli"]
+
+    # Attributes whose steps must finish first, when both are applied. Tools
+    # rewriting the same config file would otherwise lose each other's edits.
+    after: ClassVar[List[str]] = []
+
+    def is_active(self, state: DesktopState) -> bool:
+        return self.val == state.get(self.name)
+
+    def step(self, state: DesktopState) -> Optional[Step]:
+        """The command applying this value, or None if it is already active."""
+        if not self.val or self.is_active(state):
+            return None
+
+        return Step(name=self.name,
+                    args=[self.command, self.val],
+                    after=self.after)
+
+    def apply(self) -> Optional[StepResult]:
+        step = self.step(DesktopState.read())
+        return run_step(step) if step else None
+
+    @classmethod
+    def sources(cls) -> List[Path]:
+        """Directories and config files the inventory is read from."""
+        return []
 
     @classmethod
     def fetch_themes(cls, cmd: str,
                      regex: str) -> Tuple[List[str], Optional[str]]:
         """Fetch available and the current theme."""
-        if cls.available and cls.current:
-            return cls.available, cls.current
+        available, current = [], None
 
         try:
             output = subprocess.run(cmd.split(),
@@ -39,14 +78,46 @@ class BaseAttribute(BaseModel):
             for line in output.splitlines():
                 match = re.search(regex, line)
                 if match:
-                    cls.available.append(match.group(1))
+                    available.append(match.group(1))
                     if "current" in line.lower():
-                        cls.current = match.group(1)
+                        current = match.group(1)
 
-            return cls.available, cls.current
+            return available, current
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Failed to fetch themes: {e}")
 
+    @classmethod
+    def fetch_backends(cls) -> Tuple[List[str], Optional[str]]:
+        """Fetch from the first backend that finds anything.
+
+        A backend is a ``fetch_<backend>`` classmethod. The native backend reads
+        the XDG data directories, the cli backend parses the Plasma tools.
+        """
+        result, error = None, None
+        for backend in cls.backends:
+            fetch = getattr(cls, f"fetch_{backend}", None)
+            if fetch is None:
+                continue
+
+            try:
+                result = fetch()
+            except (RuntimeError, OSError) as e:
+                error = e
+                continue
+
+            if result[0]:
+                return result
+
+        if result is None:
+            raise RuntimeError(f"Failed to fetch {cls.name}s: {error}")
+
+        return result
+
+    @classmethod
+    def fetch_inventory(cls) -> Tuple[List[str], Optional[str]]:
+        """Fetch available and current values with the attribute's fetcher."""
+        return getattr(cls, f"fetch_{cls.name}s")()
+
     @classmethod
     def init_themes(cls, fetch_function):
         """Generic initialization for themes."""
@@ -60,88 +131,124 @@ class BaseAttribute(BaseModel):
 
         return self
 
+    def check(self):
+        """Load the attribute's inventory and validate the value against it."""
+        self.init_themes(self.fetch_inventory)
+        self.validate_theme()
+        return self
+
+    @model_validator(mode="after")
+    def check_strict(self):
+        if self.strict:
+            self.check()
+        return self
+
     def __str__(self) -> str:
         return self.val
 
 
 class Colorscheme(BaseAttribute):
+    name = "colorscheme"
+
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
     command = "plasma-apply-colorscheme"
 
     @classmethod
+    def sources(cls) -> List[Path]:
+        return [d / "color-schemes"
+                for d in xdg_data_dirs()] + [xdg_config_home() / "kdeglobals"]
+
+    @classmethod
+    @cached_inventory
     def fetch_colorschemes(cls) -> Tuple[List[str], Optional[str]]:
         """Fetch available colorschemes and the current colorscheme."""
-        return cls.fetch_themes(f"{cls.command} -l", r" \* ([\w\s\-]+\w)")
-
-    @model_validator(mode="after")
-    def init_colorschemes(self):
-        """Initialization of colorscheme variables."""
+        return cls.fetch_backends()
 
-        self.init_themes(self.fetch_colorschemes)
-        return self
+    @classmethod
+    def fetch_native(cls) -> Tuple[List[str], Optional[str]]:
+        return inventory.colorschemes()
 
-    @model_validator(mode="after")
-    def validate_colorscheme(self):
-        self.validate_theme()
-        return self
+    @classmethod
+    def fetch_cli(cls) -> Tuple[List[str], Optional[str]]:
+        return cls.fetch_themes(f"{cls.command} -l", r" \* ([\w\s\-]+\w)")
 
 
 class CursorTheme(BaseAttribute):
+    name = "cursortheme"
+
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
     command = "plasma-apply-cursortheme"
 
     @classmethod
+    def sources(cls) -> List[Path]:
+        return icon_dirs() + [xdg_config_home() / "kcminputrc"]
+
+    @classmethod
+    @cached_inventory
     def fetch_cursorthemes(cls) -> Tuple[List[str], Optional[str]]:
         """Fetch available cursorthemes and the current cursortheme."""
-        return cls.fetch_themes(f"{cls.command} --list-themes",
-                                r"\* .* \[(.*?)\]")
+        return cls.fetch_backends()
 
-    @model_validator(mode="after")
-    def init_cursorthemes(self):
-        self.init_themes(self.fetch_cursorthemes)
-        return self
+    @classmethod
+    def fetch_native(cls) -> Tuple[List[str], Optional[str]]:
+        return inventory.cursorthemes()
 
-    @model_validator(mode="after")
-    def validate_colorscheme(self):
-        self.validate_theme()
-        return self
+    @classmethod
+    def fetch_cli(cls) -> Tuple[List[str], Optional[str]]:
+        return cls.fetch_themes(f"{cls.command} --list-themes",
+                                r"\* .* \[(.*?)\]")
 
 
 class DesktopTheme(BaseAttribute):
+    name = "desktoptheme"
+
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
     command = "plasma-apply-desktoptheme"
 
     @classmethod
+    def sources(cls) -> List[Path]:
+        return [d / "plasma/desktoptheme"
+                for d in xdg_data_dirs()] + [xdg_config_home() / "plasmarc"]
+
+    @classmethod
+    @cached_inventory
     def fetch_desktopthemes(cls) -> Tuple[List[str], Optional[str]]:
         """Fetch available desktopthemes and the current desktoptheme."""
+        return cls.fetch_backends()
+
+    @classmethod
+    def fetch_native(cls) -> Tuple[List[str], Optional[str]]:
+        return inventory.desktopthemes()
+
+    @classmethod
+    def fetch_cli(cls) -> Tuple[List[str], Optional[str]]:
         return cls.fetch_themes(f"{cls.command} --list-themes",
                                 r" \* ([\w-]+)")
 
-    @model_validator(mode="after")
-    def init_desktopthemes(self):
-        self.init_themes(self.fetch_desktopthemes)
-        return self
 
-    @model_validator(mode="after")
-    def validate_colorscheme(self):
-        self.validate_theme()
-        return self
+class IconTheme(BaseAttribute):
+    name = "icontheme"
 
+    # plasma-apply-colorscheme rewrites kdeglobals too
+    after: ClassVar[List[str]] = ["colorscheme"]
 
-class IconTheme(BaseAttribute):
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
     @classmethod
+    def sources(cls) -> List[Path]:
+        return icon_dirs() + [xdg_config_home() / "kdeglobals"]
+
+    @classmethod
+    @cached_inventory
     def fetch_iconthemes(cls) -> Tuple[List[str], Optional[str]]:
-        if cls.available and cls.current:
-            return cls.available, cls.current
+        available = []
 
         home_dir = Path.home()
         old_icon_dir = home_dir / ".icons"
@@ -150,26 +257,16 @@ class IconTheme(BaseAttribute):
 
         for path in [old_icon_dir, icon_dir, system_icon_dir]:
             if path.exists():
-                cls.available += [
+                available += [
                     item.name for item in path.iterdir() if item.is_dir()
                 ]
 
-        kdeconfig_path = Path.home() / ".config/kdeglobals"
+        return available, DesktopState.read().icontheme
 
-        if kdeconfig_path.exists():
-            config = configparser.ConfigParser()
-            config.read(kdeconfig_path)
-
-            if config.has_section("Icons"):
-                cls.current = config.get("Icons", "Theme")
-            else:
-                cls.current = None
-
-        return cls.available, cls.current
-
-    @model_validator(mode="after")
-    def init_iconthemes(self):
-        if not self.command:
+    @classmethod
+    def find_command(cls) -> str:
+        """Locate plasma-changeicons, which is not installed on PATH."""
+        if not cls.command:
 
             search_paths = [
                 "/usr/local/libexec", "/usr/local/lib", "/usr/libexec",
@@ -182,45 +279,33 @@ class IconTheme(BaseAttribute):
                 if executable_path.is_file():
                     IconTheme.command = str(executable_path)
 
-        self.fetch_iconthemes()
-        return self
+        return cls.command
 
-    @model_validator(mode="after")
-    def validate_colorscheme(self):
-        self.validate_theme()
-        return self
+    def check(self):
+        self.find_command()
+        return super().check()
 
 
 class Wallpaper(BaseAttribute):
     path: Optional[Path] = None
+    name = "wallpaper"
     command = "plasma-apply-wallpaperimage"
     available: ClassVar[List[str]] = []
     current: ClassVar[Optional[str]] = None
 
     @classmethod
+    def sources(cls) -> List[Path]:
+        return [d / "wallpapers" for d in xdg_data_dirs()] + [
+            xdg_config_home() / "plasma-org.kde.plasma.desktop-appletsrc"
+        ]
+
+    @classmethod
+    @cached_inventory
     def fetch_wallpapers(cls) -> Tuple[List[str], Optional[str]]:
-        if cls.available and cls.current:
-            return cls.available, cls.current
-
-        config_file = Path(
-            '~/.config/plasma-org.kde.plasma.desktop-appletsrc').expanduser()
-        cls.current = ""
-
-        # Open and search for the Image variable
-        with open(config_file, 'r') as file:
-            section_found = False
-            for line in file:
-                # Look for the specific section
-                if '[Wallpaper][org.kde.image]' in line:
-                    section_found = True
-
-                # Look for the Image variable after finding the section
-                elif section_found and line.strip().startswith('Image='):
-                    cls.current = line.strip().split('=', 1)[1]
-                    cls.current = cls.current.replace('file://', '')
-                    break
-
-        cls.available = []
+        # The first desktop's wallpaper, if any desktop has one
+        current = next(iter(DesktopState.read().wallpapers.values()), "")
+
+        available = []
         valid_extensions = {
             '.jpg', '.jpeg', '.jxl', '.png', '.bmp', '.webp', '.tiff'
         }
@@ -235,25 +320,37 @@ class Wallpaper(BaseAttribute):
                 if entry.is_dir():  # Check for metadata.json in directories
                     metadata_path = entry / "metadata.json"
                     if metadata_path.is_file():
-                        cls.available.append(str(entry))
+                        available.append(str(entry))
 
                 elif entry.is_file():  # Check for valid extensions in files
                     if entry.suffix.lower() in valid_extensions:
-                        cls.available.append(str(entry))
+                        available.append(str(entry))
 
-        return cls.available, cls.current
+        return available, current
+
+    def is_active(self, state: DesktopState) -> bool:
+        # Applying sets every desktop, so all of them must already match
+        return bool(state.wallpapers) and all(
+            image == self.val for image in state.wallpapers.values())
 
     @model_validator(mode="after")
-    def init_wallpaper(self):
+    def resolve_path(self):
+        """Expand wallpaper paths, names are resolved by check()."""
+        if self.val and not self.path:
+            path = Path(self.val).expanduser()
+            if path.exists():
+                self.path = path
+                self.val = str(path)
+
+        return self
+
+    def check(self):
         self.init_themes(self.fetch_wallpapers)
 
         name_to_path = {Path(p).name: Path(p) for p in self.available}
 
-        if self.val:
-            if self.val in name_to_path:
-                self.path = name_to_path[self.val]
-            else:
-                self.path = Path(self.val).expanduser()
+        if self.val in name_to_path:
+            self.path = name_to_path[self.val]
 
         if self.path and self.path.exists():
             self.val = str(self.path)
@@ -261,14 +358,64 @@ class Wallpaper(BaseAttribute):
             if self.val not in self.available:
                 self.available.append(self.val)
 
-        return self
-
-    @model_validator(mode="after")
-    def validate_colorscheme(self):
         self.validate_theme()
         return self
 
 
+def is_clock_time(item: str) -> bool:
+    return re.match(r'^\d{2}:\d{2}$', item) is not None
+
+
+def clock_time(item: str) -> datetime:
+    """Resolve HH:MM to a datetime, tomorrow if it already passed today."""
+    # Parse "HH:MM" into a datetime object with today's date
+    now = datetime.now()
+    hour, minute = map(int, item.split(':'))
+    dt = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    # If the time has already passed today, schedule for tomorrow
+    if dt < now:
+        dt += timedelta(days=1)
+
+    return dt
+
+
+ATTRIBUTES = {
+    cls.name: cls
+    for cls in [Colorscheme, CursorTheme, DesktopTheme, IconTheme, Wallpaper]
+}
+
+
+def discover(
+    names: Optional[Iterable[str]] = None
+) -> Dict[str, Tuple[List[str], Optional[str]]]:
+    """Fetch attribute inventories concurrently.
+
+    Returns the available and current values keyed by attribute name. An
+    attribute whose fetch fails is left out, its error surfaces again when a
+    theme using it is validated.
+    """
+    classes = [
+        ATTRIBUTES[name] for name in (ATTRIBUTES if names is None else names)
+    ]
+    inventory = {}
+
+    if not classes:
+        return inventory
+
+    with ThreadPoolExecutor(max_workers=len(classes)) as pool:
+        futures = {cls: pool.submit(cls.fetch_inventory) for cls in classes}
+
+    # Validation reads the class inventories, so they are set here too
+    for cls, future in futures.items():
+        try:
+            cls.available, cls.current = inventory[cls.name] = future.result()
+        except (RuntimeError, OSError):
+            continue
+
+    return inventory
+
+
 class Theme(BaseModel):
     colorscheme: Optional[Colorscheme] = None
     cursortheme: Optional[CursorTheme] = None
@@ -307,31 +454,60 @@ class Theme(BaseModel):
                                for key, value in components.items())
         return result
 
-    def kshift(self) -> None:
+    def attributes(self) -> List[BaseAttribute]:
+        return [
+            getattr(self, name) for name in ATTRIBUTES if getattr(self, name)
+        ]
 
-        for attr in [
-                self.colorscheme, self.cursortheme, self.desktoptheme,
-                self.icontheme, self.wallpaper
-        ]:
-            if attr:
-                attr.apply()
+    def check(self):
+        """Discover the inventories this theme uses and validate against them."""
+        attrs = self.attributes()
+        discover([attr.name for attr in attrs])
+
+        for attr in attrs:
+            attr.check()
+
+        return self
+
+    def plan(self) -> Plan:
+        """Diff the theme against a fresh snapshot of the desktop."""
+        state = DesktopState.read()
+        plan = Plan()
+
+        for attr in self.attributes():
+            step = attr.step(state)
+            if step:
+                current = state.get(attr.name)
+                plan.add(
+                    step, attr.val, f"current is {current}"
+                    if current else "current value unknown")
+            else:
+                plan.skip(attr.name, attr.val, "already active")
 
         if self.command:
-            os.system(self.command)
+            # What the command does can't be diffed, so it runs on every apply,
+            # after the attributes it may rely on
+            plan.add(Step(name="command",
+                          args=self.command,
+                          after=[step.name for step in plan.steps],
+                          timeout=COMMAND_TIMEOUT),
+                     self.command,
+                     reason="runs on every apply")
+
+        return plan
+
+    def kshift(self, plan: Optional[Plan] = None) -> List[StepResult]:
+        """Apply the theme, running independent attributes concurrently.
+
+        Only the changes in ``plan``, by default a fresh one, are applied.
+        """
+        self.check()
+        return run_steps((plan or self.plan()).steps)
 
     @model_validator(mode="before")
     def parse_attributes(cls, values):
-        mtch = {
-            "colorscheme": Colorscheme,
-            "cursortheme": CursorTheme,
-            "desktoptheme": DesktopTheme,
-            "icontheme": IconTheme,
-            "wallpaper": Wallpaper
-        }
-
-        for attr in mtch.keys():
+        for attr, attr_cls in ATTRIBUTES.items():
             if attr in values and isinstance(values[attr], str):
-                attr_cls = mtch[attr]
                 values[attr] = attr_cls(val=values[attr])
 
         return values
@@ -361,18 +537,8 @@ class Theme(BaseModel):
         new_times = []
         for item in times:
             if isinstance(item, str):
-                if re.match(r'^\d{2}:\d{2}$', item):
-                    # Parse "HH:MM" into a datetime object with today's date
-                    now = datetime.now()
-                    hour, minute = map(int, item.split(':'))
-                    dt = now.replace(hour=hour,
-                                     minute=minute,
-                                     second=0,
-                                     microsecond=0)
-                    # If the time has already passed today, schedule for tomorrow
-                    if dt < now:
-                        dt += timedelta(days=1)
-                    item = dt
+                if is_clock_time(item):
+                    item = clock_time(item)
 
                 new_times.append(item)
             elif isinstance(item, datetime):
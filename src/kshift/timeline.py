@@ -0,0 +1,121 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from kshift.oncalendar import CalendarSpec
+from kshift.theme import Theme
+
+# Days covered on either side of the time a timeline is built for
+WINDOW = 7
+
+# Most triggers kept on each side of now per theme time, bounding times like
+# minutely
+MAX_TRIGGERS = 1000
+
+
+def _triggers(time, start: datetime, end: datetime,
+              now: datetime) -> Tuple[List[datetime], datetime, datetime]:
+    """Every firing of a theme time in ``start``..``end``, plus the last
+    firing before ``start``.
+
+    Firings are collected outwards from ``now``, so times too frequent to
+    keep whole still cover it. Returns the firings and the part of the
+    window they are complete for.
+    """
+    if isinstance(time, datetime):
+        # HH:MM and sunrise/sunset times repeat daily
+        day = datetime.combine(start.date() - timedelta(days=1), time.time())
+        fires = []
+        while day <= end:
+            fires.append(day)
+            day += timedelta(days=1)
+        return fires, start, end
+
+    try:
+        spec = CalendarSpec.parse(time)
+    except ValueError:
+        # Forms only systemd understands are left to its timers
+        return [], start, end
+
+    # Back to the first firing before the window
+    before = []
+    fire = spec.previous_elapse(now)
+    while fire and len(before) < MAX_TRIGGERS:
+        before.append(fire)
+        if fire < start:
+            break
+        fire = spec.previous_elapse(fire - timedelta(seconds=1))
+
+    if len(before) == MAX_TRIGGERS and before[-1] >= start:
+        start = before[-1]
+
+    after = []
+    fire = spec.next_elapse(now)
+    while fire and fire <= end and len(after) < MAX_TRIGGERS:
+        after.append(fire)
+        fire = spec.next_elapse(fire)
+
+    if fire and fire <= end:
+        end = after[-1]
+
+    return before[::-1] + after, start, end
+
+
+class Timeline(BaseModel):
+    """Every theme trigger around a point in time, sorted by time.
+
+    ``times`` and ``themes`` are parallel, so lookups are a bisection.
+    """
+    start: datetime
+    end: datetime
+
+    times: List[datetime] = []
+    themes: List[str] = []
+
+    @classmethod
+    def build(cls,
+              themes: Dict[str, Theme],
+              now: Optional[datetime] = None,
+              days: int = WINDOW) -> "Timeline":
+        now = now or datetime.now()
+        start, end = now - timedelta(days=days), now + timedelta(days=days)
+
+        # The window shrinks to what capped frequent times cover
+        triggers = []
+        for name, theme in themes.items():
+            for time in theme.time:
+                fires, first, last = _triggers(time, start, end, now)
+                triggers += [(fire, name) for fire in fires]
+                start, end = max(start, first), min(end, last)
+
+        triggers.sort()
+
+        return cls(start=start,
+                   end=end,
+                   times=[fire for fire, _ in triggers],
+                   themes=[name for _, name in triggers])
+
+    def covers(self, at: datetime) -> bool:
+        return self.start <= at <= self.end
+
+    def last(self, at: datetime) -> Optional[Tuple[datetime, str]]:
+        """The latest trigger at or before ``at``."""
+        i = bisect_right(self.times, at)
+        return (self.times[i - 1], self.themes[i - 1]) if i else None
+
+    def active(self, at: datetime) -> Optional[str]:
+        """The theme that should be active at ``at``."""
+        last = self.last(at)
+        return last[1] if last else None
+
+    def next_switch(self, after: datetime) -> Optional[Tuple[datetime, str]]:
+        """The first trigger after ``after`` changing the active theme."""
+        active = self.active(after)
+
+        for i in range(bisect_right(self.times, after), len(self.times)):
+            if self.themes[i] != active:
+                return self.times[i], self.themes[i]
+
+        return None
@@ -4,6 +4,41 @@ import subprocess
 import re
 import os
 import configparser
+import tempfile
+
+from typing import Dict, List, Optional, Union
+
+
+# XDG base directories, resolved at call time so tests can redirect them
+def xdg_config_home() -> Path:
+    return Path(os.getenv("XDG_CONFIG_HOME", Path.home() / ".config"))
+
+
+def xdg_cache_home() -> Path:
+    return Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache"))
+
+
+def xdg_data_dirs() -> List[Path]:
+    """User data directory first, followed by the system data directories."""
+    data_home = Path(os.getenv("XDG_DATA_HOME", Path.home() / ".local/share"))
+    data_dirs = os.getenv("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+
+    return [data_home] + [Path(d) for d in data_dirs.split(":") if d]
+
+
+# Writes a file through a temporary sibling so readers never see partial data
+def atomic_write(path: Path, content: Union[str, bytes]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd,
+                       "wb" if isinstance(content, bytes) else "w") as file:
+            file.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 
 # Gets the names of all available colorschemes
@@ -94,24 +129,61 @@ def time_to_systemd(time):
     if time is None:
         return time
 
-    process = subprocess.run(["systemd-analyze", "calendar", time],
-                             stdout=subprocess.PIPE)
-    stat_code = process.returncode
+    normalized = normalize_calendars([time])
+    if time not in normalized:
+        raise ValueError("Invalid systemd calendar time!: " + time)
 
-    if stat_code == 0:
-        calendar_time = ""
-        output = process.stdout.decode('utf-8').strip()
+    return normalized[time]
+
+
+# Normalizes OnCalendar times with one systemd-analyze run for all of them.
+# Invalid times are left out of the result.
+def normalize_calendars(times: List[str]) -> Dict[str, str]:
+    times = list(dict.fromkeys(times))
+    if not times:
+        return {}
+
+    process = subprocess.run(["systemd-analyze", "calendar", *times],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL)
+
+    # One block per valid time, invalid times are only reported on stderr
+    #   Original form: daily
+    # Normalized form: *-*-* 00:00:00
+    # A time already in normalized form has no "Original form" line
+    normalized = {}
+    original = None
+    for line in process.stdout.decode('utf-8').splitlines():
+        r = re.search("(Original|Normalized) form: (.*)", line)
+        if r and r.group(1) == "Original":
+            original = r.group(2)
+        elif r:
+            normalized[r.group(2) if original is None else original] = r.group(
+                2)
+            original = None
+
+    return {t: normalized[t.strip()] for t in times if t.strip() in normalized}
+
+
+# Gets the first elapse of an OnCalendar time after `after`, in local time
+def calendar_next_elapse(time: str, after: datetime) -> Optional[datetime]:
+    process = subprocess.run([
+        "systemd-analyze", "calendar",
+        f"--base-time=@{int(after.timestamp())}", time
+    ],
+                             stdout=subprocess.PIPE)
 
-        for line in output.splitlines():
-            r = re.search("Normalized form: (.*)", line)
-            if r:
-                calendar_time = r.group(1)
-                break
+    if process.returncode != 0:
+        raise ValueError("Invalid systemd calendar time!: " + time)
 
-        return calendar_time
+    for line in process.stdout.decode('utf-8').splitlines():
+        # Next elapse: Mon 2026-01-05 10:00:00 UTC
+        r = re.search(r"Next elapse: (\w+ \S+ \S+)", line)
+        if r:
+            return datetime.strptime(r.group(1), "%a %Y-%m-%d %H:%M:%S")
 
-    else:
-        raise ValueError("Invalid systemd calendar time!: " + time)
+    # The time never elapses again
+    return None
 
 
 # Converting to today's version of datetime for theme comparison
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def sun_resolver():
+    from kshift.conf import sun_resolver
+
+    # Sun data is memoized for the process, start every test without it
+    sun_resolver.invalidate()
+    sun_resolver.fetches = 0
+    yield sun_resolver
@@ -26,3 +26,158 @@ def test_get_sundata_real_api(mocker):
 
     assert sunrise.time != default_sunrise.time
     assert sunset.time != default_sunset.time
+
+
+def test_stale_sundata_refreshed_in_background(monkeypatch, tmp_path):
+    import json
+    import threading
+
+    from datetime import timedelta
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from kshift import conf
+
+    requests = []
+
+    class SunAPI(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            requests.append(self.path)
+            body = json.dumps({
+                "results": {
+                    "sunrise": "6:01:00 AM",
+                    "sunset": "7:02:00 PM"
+                }
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SunAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(conf, "SUN_API",
+                        f"http://127.0.0.1:{server.server_port}/json")
+
+    # Fetched two days ago
+    fetched = datetime.now() - timedelta(days=2)
+    cache = tmp_path / "kshift" / "39-77.out"
+    cache.parent.mkdir()
+    cache.write_text(
+        json.dumps({
+            "location": "39,-77",
+            "sunrise": fetched.replace(hour=5, minute=30).isoformat(),
+            "sunset": fetched.replace(hour=20, minute=30).isoformat()
+        }))
+
+    try:
+        # The stale times are used right away, once for both themes
+        config = conf.Config(sun_source="web", xdg_cache=tmp_path)
+        assert conf.sun_resolver.fetches == 1
+        assert config.sunrise.strftime("%H:%M") == "05:30"
+        assert config.sunrise.date() == datetime.now().date()
+
+        config._refresh.join(5)
+        assert len(requests) == 1
+        today = datetime.now().date().isoformat()
+        assert json.loads(cache.read_text())["days"][today]["sunrise"] == (
+            f"{today}T06:01:00")
+
+        # Too stale to use, fetched before returning
+        conf.sun_resolver.invalidate()
+        cache.write_text(
+            json.dumps({
+                "location":
+                "39,-77",
+                "sunrise":
+                fetched.replace(hour=5, minute=30).isoformat(),
+                "sunset":
+                fetched.replace(hour=20, minute=30).isoformat()
+            }))
+        config = conf.Config(sun_source="web",
+                             xdg_cache=tmp_path,
+                             max_staleness=1)
+        assert config.sunrise.strftime("%H:%M") == "06:01"
+        assert config._refresh is None
+        assert len(requests) == 2
+    finally:
+        server.shutdown()
+
+
+def test_prefetch_covers_offline_days(monkeypatch, tmp_path):
+    import json
+    import threading
+
+    from datetime import date, timedelta
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    from kshift import conf
+
+    clients = []
+
+    class SunAPI(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            clients.append(self.client_address)
+            query = parse_qs(urlparse(self.path).query)
+            day = date.fromisoformat(query["date_start"][0])
+            end = date.fromisoformat(query["date_end"][0])
+
+            results = []
+            while day <= end:
+                results.append({
+                    "date": day.isoformat(),
+                    "sunrise": f"6:{day.day:02}:00 AM",
+                    "sunset": "7:00:00 PM"
+                })
+                day += timedelta(days=1)
+
+            body = json.dumps({"results": results}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SunAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(conf, "SUN_API",
+                        f"http://127.0.0.1:{server.server_port}/json")
+
+    try:
+        config = conf.Config(sun_source="web", xdg_cache=tmp_path)
+        config.fetch_sundata()
+    finally:
+        server.shutdown()
+
+    # A week in one request each, over one pooled connection
+    assert len(clients) == 2 and clients[0] == clients[1]
+    days = config.cached_sundata()
+    today = datetime.now().date()
+    assert sorted(days) == [today + timedelta(days=i) for i in range(7)]
+    assert days[today][0].strftime("%H:%M") == f"06:{today.day:02}"
+
+    # Prefetched yesterday, today's times are exact without going online
+    cache = tmp_path / "kshift" / "39-77.out"
+    cached = json.loads(cache.read_text())
+    yesterday = (today - timedelta(days=1)).isoformat()
+    cached["days"][yesterday] = cached["days"][today.isoformat()]
+    del cached["days"][max(cached["days"])]
+    cache.write_text(json.dumps(cached))
+
+    conf.sun_resolver.invalidate()
+    config = conf.Config(sun_source="web", xdg_cache=tmp_path)
+    assert config.sunrise.strftime("%H:%M") == f"06:{today.day:02}"
+    assert config._cacheable and config._refresh is None
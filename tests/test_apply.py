@@ -0,0 +1,44 @@
+import sys
+
+from kshift.apply import Step, run_steps
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def test_steps_run_concurrently_in_order(tmp_path):
+    log = tmp_path / "log"
+    append = "import sys; open(sys.argv[1], 'a').write(sys.argv[2] + '\\n')"
+
+    steps = [
+        Step(name="slow",
+             args=python(f"import time; time.sleep(0.5); {append}") +
+             [str(log), "slow"]),
+        Step(name="fast", args=python(append) + [str(log), "fast"]),
+        Step(name="command",
+             args=f"echo command >> {log}",
+             after=["slow", "fast"]),
+    ]
+
+    results = run_steps(steps)
+
+    assert [r.name for r in results] == ["slow", "fast", "command"]
+    assert all(r.ok for r in results)
+    assert log.read_text().split() == ["fast", "slow", "command"]
+
+
+def test_step_timeout_and_failure():
+    results = run_steps([
+        Step(name="hang",
+             args=python("import time; time.sleep(5)"),
+             timeout=0.2),
+        Step(name="fail", args=python("raise SystemExit(3)")),
+        Step(name="missing", args=["kshift-no-such-tool"]),
+    ])
+
+    hang, fail, missing = results
+    assert not hang.ok and "timed out" in hang.error
+    assert hang.duration < 5
+    assert not fail.ok and fail.returncode == 3
+    assert not missing.ok
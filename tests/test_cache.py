@@ -0,0 +1,80 @@
+import pytest
+
+from kshift.cache import cached_inventory, fingerprint, load_inventory
+
+
+def test_inventory_cache_invalidation(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    source = tmp_path / "color-schemes"
+    source.mkdir()
+
+    calls = []
+
+    class Attribute:
+        available = []
+        current = None
+
+        @classmethod
+        def sources(cls):
+            return [source]
+
+        @classmethod
+        @cached_inventory
+        def fetch(cls):
+            calls.append(1)
+            return ["BreezeDark", "BreezeLight"], "BreezeDark"
+
+    assert Attribute.fetch() == (["BreezeDark", "BreezeLight"], "BreezeDark")
+
+    # A fresh process only has the on-disk cache
+    Attribute.available = []
+    assert Attribute.fetch() == (["BreezeDark", "BreezeLight"], "BreezeDark")
+    assert len(calls) == 1
+
+    # Installing a theme changes the directory mtime
+    (source / "Nord.colors").touch()
+    assert load_inventory("Attribute", fingerprint([source])) is None
+
+    Attribute.available = []
+    Attribute.fetch()
+    assert len(calls) == 2
+
+
+def test_calendars_normalized_in_one_run(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    import subprocess
+    from kshift.cache import normalized_calendars
+
+    run = mocker.spy(subprocess, "run")
+
+    # Fractional seconds are left to systemd-analyze
+    times = ["daily", "12:30:15.5", "Mon *-*-* 10:00:00.25"]
+
+    assert normalized_calendars(times) == {
+        "daily": "*-*-* 00:00:00",
+        "12:30:15.5": "*-*-* 12:30:15.500000",
+        "Mon *-*-* 10:00:00.25": "Mon *-*-* 10:00:00.250000",
+    }
+    assert run.call_count == 1
+
+    # Known times are never normalized again, not even by a new process
+    normalized_calendars(times)
+    assert run.call_count == 1
+
+    # Times already in normalized form are printed without an original
+    assert normalized_calendars(["*-*-* 10:00:00.500000", "hourly"]) == {
+        "*-*-* 10:00:00.500000": "*-*-* 10:00:00.500000",
+        "hourly": "*-*-* *:00:00",
+    }
+    assert run.call_count == 2
+
+    with pytest.raises(ValueError, match="bogus"):
+        normalized_calendars(["monthly", "bogus"])
+    assert run.call_count == 3
+
+
+def test_normalized_time_to_systemd():
+    from kshift.utils import time_to_systemd
+
+    assert time_to_systemd("*-*-* 10:00:00") == "*-*-* 10:00:00"
@@ -0,0 +1,37 @@
+def test_snapshot_skips_validation(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    from kshift import conf
+    from kshift.theme import Colorscheme
+
+    mocker.patch.object(Colorscheme, "available", ["BreezeDark"])
+    mocker.patch.object(Colorscheme, "current", "BreezeDark")
+
+    config_file = conf.config_path()
+    config_file.parent.mkdir(parents=True)
+    config_file.write_text("webdata: false\n"
+                           "themes:\n"
+                           "  evening:\n"
+                           "    colorscheme: BreezeDark\n"
+                           "    time: ['07:30', 'Mon *-*-* 10:00', sunset]\n")
+
+    validated = conf.load_config()
+    assert conf.snapshot_file().exists()
+
+    parse = mocker.patch.object(conf.yaml,
+                                "safe_load",
+                                side_effect=AssertionError("parsed"))
+    loaded = conf.load_config()
+
+    evening = loaded.themes["evening"]
+    assert evening.colorscheme.val == "BreezeDark"
+    assert evening.time == validated.themes["evening"].time
+    assert evening.time[1] == "Mon *-*-* 10:00:00"
+    assert loaded.api_file == validated.api_file
+
+    # Editing the config validates it again
+    config_file.write_text("webdata: false\n")
+    parse.side_effect = None
+    parse.return_value = {"webdata": False}
+    assert "evening" not in conf.load_config().themes
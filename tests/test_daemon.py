@@ -0,0 +1,85 @@
+import asyncio
+import os
+import subprocess
+import threading
+import time
+
+from kshift import daemon
+
+
+def test_daemon_runs_forwarded_commands(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert daemon.request(["status"], {}) is None
+
+    def run(args):
+        print(" ".join(args), os.environ.get("SOURCE"))
+        subprocess.run(["sh", "-c", "pwd; echo tool >&2"])
+        return 3
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(daemon.serve(run))
+    thread = threading.Thread(target=loop.run_until_complete,
+                              args=(asyncio.gather(task,
+                                                   return_exceptions=True), ))
+    thread.start()
+
+    try:
+        for _ in range(50):
+            if daemon.running():
+                break
+            time.sleep(0.05)
+
+        # Output of the programs a command runs is sent back too
+        monkeypatch.chdir(tmp_path)
+        response = daemon.request(["theme", "night"], {"SOURCE": "systemd"})
+        assert response == {
+            "output": f"theme night systemd\n{tmp_path}\ntool\n",
+            "code": 3
+        }
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(5)
+        loop.close()
+
+    assert not daemon.socket_path().exists()
+
+
+def test_client_forwards_before_loading_cli():
+    import subprocess
+    import sys
+
+    # A fresh interpreter, this one already imported everything
+    script = (
+        "import sys\n"
+        "from kshift import client, daemon\n"
+        "daemon.request = lambda args, env: {'output': 'ok\\n', 'code': 3}\n"
+        "sys.argv = ['kshift', 'theme', 'night']\n"
+        "try:\n"
+        "    client.main()\n"
+        "except SystemExit as e:\n"
+        "    print(e.code, 'kshift.conf' in sys.modules,\n"
+        "          'pydantic' in sys.modules)\n")
+    src = os.path.dirname(os.path.dirname(daemon.__file__))
+    result = subprocess.run([sys.executable, "-c", script],
+                            env={
+                                **os.environ, "PYTHONPATH": src
+                            },
+                            capture_output=True,
+                            text=True,
+                            check=True)
+
+    assert result.stdout == "ok\n3 False False\n"
+
+
+def test_commands_run_in_client_directory(tmp_path, monkeypatch):
+    client_dir = tmp_path / "client"
+    client_dir.mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    def run(args):
+        print(os.path.abspath(args[0]))
+        return 0
+
+    response = daemon.capture(run, ["pic.png"], {}, str(client_dir))
+    assert response["output"] == f"{client_dir / 'pic.png'}\n"
+    assert os.getcwd() == str(tmp_path)
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from kshift import history
+from kshift.apply import Plan, Step, StepResult
+
+
+def test_history_query_and_stats(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    plan = Plan()
+    plan.add(Step(name="colorscheme", args=["true"]), "BreezeDark", "changed")
+    results = [StepResult(name="colorscheme", ok=True, duration=0.5)]
+
+    history.record("night", "systemd", plan, results, 1.0)
+    history.record("night", "direct", plan, results, 3.0)
+    history.record("day", "systemd", plan,
+                   [StepResult(name="colorscheme", ok=False, duration=0.1)],
+                   0.5)
+
+    applies = history.query(theme="night")
+    assert [a.source for a in applies] == ["systemd", "direct"]
+    assert applies[0].steps == results
+
+    assert len(history.query(source="systemd")) == 2
+    assert history.query(since=datetime.now() + timedelta(hours=1)) == []
+
+    stats = {s.theme: s for s in history.stats()}
+    assert stats["night"].count == 2 and stats["night"].mean == 2.0
+    assert stats["day"].failed == 1
+
+
+def test_parse_since():
+    assert history.parse_since("2024-03-05") == datetime(2024, 3, 5)
+    since = history.parse_since("7d")
+    assert datetime.now() - since >= timedelta(days=7)
@@ -0,0 +1,83 @@
+import pytest
+
+from kshift.theme import Colorscheme, CursorTheme, DesktopTheme
+
+
+@pytest.fixture
+def plasma_home(tmp_path, monkeypatch):
+    """A synthetic home with a few themes installed and no Plasma tools."""
+    data = tmp_path / "share"
+    config = tmp_path / "config"
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "local"))
+    monkeypatch.setenv("XDG_DATA_DIRS", str(data))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(config))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+
+    (data / "color-schemes").mkdir(parents=True)
+    for scheme in ["BreezeDark", "BreezeLight"]:
+        (data / "color-schemes" / f"{scheme}.colors").touch()
+
+    (data / "icons/breeze_cursors/cursors").mkdir(parents=True)
+    (data / "icons/breeze_cursors/index.theme").touch()
+    (data / "icons/Papirus").mkdir(parents=True)
+
+    (data / "plasma/desktoptheme/breeze-dark").mkdir(parents=True)
+    (data / "plasma/desktoptheme/breeze-dark/metadata.json").touch()
+    (data / "plasma/desktoptheme/empty").mkdir(parents=True)
+
+    config.mkdir()
+    (config / "kdeglobals").write_text("[General]\nColorScheme=BreezeDark\n")
+    (config / "plasmarc").write_text("[Theme]\nname=breeze-dark\n")
+
+    for cls in [Colorscheme, CursorTheme, DesktopTheme]:
+        monkeypatch.setattr(cls, "available", [])
+        monkeypatch.setattr(cls, "current", None)
+        monkeypatch.setattr(cls, "inventory_stamps", None)
+
+    return tmp_path
+
+
+def test_native_backend(plasma_home):
+    assert Colorscheme.fetch_inventory() == (["BreezeDark",
+                                              "BreezeLight"], "BreezeDark")
+    assert CursorTheme.fetch_inventory() == (["breeze_cursors"], None)
+    assert DesktopTheme.fetch_inventory() == (["breeze-dark"], "breeze-dark")
+
+
+def test_cli_backend_fallback(plasma_home, monkeypatch):
+    monkeypatch.setattr(Colorscheme, "backends", ["cli"])
+
+    bin_dir = plasma_home / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "plasma-apply-colorscheme"
+    script.write_text("#!/bin/sh\n"
+                      "echo 'You have the following color schemes:'\n"
+                      "echo ' * Nord (current color scheme)'\n")
+    script.chmod(0o755)
+
+    assert Colorscheme.fetch_inventory() == (["Nord"], "Nord")
+
+
+def test_check_fetches_inventory_once(plasma_home, monkeypatch, mocker):
+    from kshift import inventory
+    from kshift.theme import Theme
+
+    # An unwritable cache, so only the class inventory is reused
+    (plasma_home / "cache").write_text("")
+    fetch = mocker.spy(inventory, "colorschemes")
+
+    Theme(colorscheme="BreezeLight").check()
+    assert fetch.call_count == 1
+
+
+def test_theme_installed_while_running(plasma_home):
+    Colorscheme(val="BreezeDark").check()
+    with pytest.raises(ValueError):
+        Colorscheme(val="Nord").check()
+
+    # The daemon keeps its inventory, but notices the new scheme
+    (plasma_home / "share/color-schemes/Nord.colors").touch()
+    assert Colorscheme(val="Nord").check().val == "Nord"
+    assert Colorscheme.available == ["BreezeDark", "BreezeLight", "Nord"]
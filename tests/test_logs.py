@@ -0,0 +1,49 @@
+import json
+
+from kshift import logs
+
+
+def test_tail_reads_backwards_across_rotation(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "BLOCK_SIZE", 16)
+    log = tmp_path / "kshift.log"
+    (tmp_path / "kshift.log.1").write_text("".join(f"old {i}\n"
+                                                   for i in range(5)))
+    log.write_text("".join(f"new {i}\n" for i in range(3)))
+
+    assert logs.tail(log, 2) == ["new 1\n", "new 2\n"]
+    assert logs.tail(
+        log, 5) == ["old 3\n", "old 4\n", "new 0\n", "new 1\n", "new 2\n"]
+    assert list(logs.read_all(log))[0] == "old 0\n"
+
+
+def test_follow_through_rotation(tmp_path):
+    log = tmp_path / "kshift.log"
+    log.write_text("before\n")
+
+    lines = logs.follow(log, poll=0.01)
+
+    with open(log, "a") as f:
+        f.write("first\n")
+    assert next(lines) == "first\n"
+
+    # Rotated like RotatingFileHandler does, with a last line in the old log
+    with open(log, "a") as f:
+        f.write("last\n")
+    log.rename(tmp_path / "kshift.log.1")
+    log.write_text("second\n")
+
+    assert next(lines) == "last\n"
+    assert next(lines) == "second\n"
+    lines.close()
+
+
+def test_decode():
+    event = {"event": "theme_change", "theme": "night"}
+    line = f"2024-03-05 18:00:00 - INFO - {json.dumps(event)}\n"
+
+    assert logs.decode(line) == {
+        "time": "2024-03-05T18:00:00",
+        "level": "INFO",
+        **event
+    }
+    assert logs.decode("garbage\n") is None
@@ -0,0 +1,123 @@
+import subprocess
+
+from click.testing import CliRunner
+
+
+def test_cheap_commands_skip_config(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    spawn = mocker.patch.object(subprocess,
+                                "Popen",
+                                side_effect=AssertionError("spawned"))
+
+    from kshift import main
+    load = mocker.patch.object(main, "load_config")
+    log_file = tmp_path / "kshift.log"
+    log_file.write_text("line\n")
+    mocker.patch.object(main, "log_file", log_file)
+
+    runner = CliRunner()
+    for args in (["--help"], ["logs"], ["config"], ["theme", "--help"]):
+        result = runner.invoke(main.cli, args)
+        assert result.exit_code == 0, result.output
+
+    load.assert_not_called()
+    spawn.assert_not_called()
+
+
+def test_logging_is_queued(tmp_path, mocker):
+    from kshift import main
+    log_file = tmp_path / "kshift" / "kshift.log"
+    mocker.patch.object(main, "log_file", log_file)
+
+    main.log_event({"event": "theme_change", "theme": "night"})
+    main.stop_logging()
+
+    assert '"theme": "night"' in log_file.read_text()
+
+
+def test_last_theme_recovered_from_logs(tmp_path, mocker):
+    from datetime import datetime
+
+    from kshift import main
+    from kshift.theme import Theme
+
+    config = mocker.Mock(themes={"day": Theme(), "night": Theme()})
+    mocker.patch.object(main, "get_config", return_value=config)
+
+    log_file = tmp_path / "kshift.log"
+    (tmp_path / "kshift.log.1").write_text(
+        '2024-01-01 19:00:00 - INFO - {"event": "theme_change", '
+        '"theme": "night", "source": "systemd"}\n')
+    log_file.write_text(
+        '2024-01-02 07:00:00 - INFO - {"event": "theme_change", '
+        '"theme": "day", "source": "direct"}\n'
+        "not a log line\n")
+
+    assert main.parse_theme_logs(log_file) == ("night",
+                                               datetime(2024, 1, 1, 19, 0))
+
+
+def test_scheduler_leaves_systemd_alone(mocker):
+    from kshift import main
+    from kshift.theme import Theme
+
+    config = mocker.Mock(themes={"night": Theme()})
+    mocker.patch.object(main, "reload_config")
+    mocker.patch.object(main, "get_config", return_value=config)
+    mocker.patch.object(main, "apply_theme", return_value=[])
+    logged = mocker.patch.object(main, "log_theme_change")
+    write = mocker.patch.object(main, "write_systemd")
+
+    assert main.apply_scheduled(["night"]) == 0
+    assert main.apply_scheduled(["missing"]) == 1
+
+    logged.assert_called_once_with("night", [])
+    write.assert_not_called()
+
+
+def test_schedule_refused_with_timers_enabled(tmp_path, monkeypatch, mocker):
+    from kshift import main
+    from kshift.systemd import TimerStatus
+
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    (tmp_path / "kshift-night.timer").touch()
+    config = mocker.Mock(systemd_loc=tmp_path)
+    mocker.patch.object(main, "reload_config")
+    mocker.patch.object(main, "get_config", return_value=config)
+    mocker.patch.object(main.kshift_systemd.Systemctl,
+                        "timers",
+                        return_value={
+                            "kshift-night.timer":
+                            TimerStatus(unit="kshift-night.timer",
+                                        enabled=True,
+                                        active=True)
+                        })
+    serve = mocker.patch.object(main.kshift_daemon, "serve")
+
+    result = CliRunner().invoke(main.cli, ["daemon", "--schedule"])
+
+    assert result.exit_code == 1
+    assert "kshift remove" in result.output
+    serve.assert_not_called()
+
+
+def test_invalid_theme_exits_non_zero(mocker):
+    from kshift import main
+    from kshift.theme import Colorscheme, Theme
+
+    config = mocker.Mock(themes={"night": Theme(colorscheme="Missing")})
+    mocker.patch.object(main, "get_config", return_value=config)
+    mocker.patch.object(main.kshift_systemd.Systemctl,
+                        "is_enabled",
+                        return_value=False)
+    mocker.patch.object(Colorscheme,
+                        "fetch_inventory",
+                        return_value=(["BreezeDark"], "BreezeDark"))
+    logged = mocker.patch.object(main, "log_theme_change")
+
+    result = CliRunner().invoke(main.cli, ["theme", "night"])
+
+    assert result.exit_code == 1
+    assert "Error: Invalid attribute: Missing" in result.output
+    logged.assert_not_called()
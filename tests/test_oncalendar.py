@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from kshift.oncalendar import CalendarSpec, normalize
+
+
+@pytest.mark.parametrize("text, normalized", [
+    ("daily", "*-*-* 00:00:00"),
+    ("Mon,Tue,Wed,Fri 8:00", "Mon..Wed,Fri *-*-* 08:00:00"),
+    ("*:0/15", "*-*-* *:00/15:00"),
+    ("Mon *-05~07/1", "Mon *-05~07/1 00:00:00"),
+    ("3,1,2:00", "*-*-* 01,02,03:00:00"),
+])
+def test_normalize(text, normalized):
+    assert normalize(text) == normalized
+
+
+@pytest.mark.parametrize("text", ["*:*/15", "Sat..Mon", "24:00", "bogus"])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        CalendarSpec.parse(text)
+
+
+def test_elapses():
+    now = datetime(2026, 1, 1, 12, 0)
+
+    # The last Monday of May
+    spec = CalendarSpec.parse("Mon *-05~07/1 10:00")
+    assert spec.next_elapse(now) == datetime(2026, 5, 25, 10, 0)
+    assert spec.previous_elapse(now) == datetime(2025, 5, 26, 10, 0)
+
+    spec = CalendarSpec.parse("Mon..Fri 12:00")
+    assert spec.next_elapse(now) == datetime(2026, 1, 2, 12, 0)
+    assert spec.previous_elapse(now) == now
+
+    assert CalendarSpec.parse("2025-01-01").next_elapse(now) is None
+
+
+def test_elapses_within_day():
+    spec = CalendarSpec.parse("*-*-* 08..17:*:0/10")
+
+    assert spec.next_elapse(datetime(2024, 3, 8, 12, 0,
+                                     5)) == datetime(2024, 3, 8, 12, 0, 10)
+    assert spec.next_elapse(datetime(2024, 3, 8, 17, 59,
+                                     50)) == datetime(2024, 3, 9, 8, 0, 0)
+    assert spec.previous_elapse(datetime(2024, 3, 8, 12, 0,
+                                         5)) == datetime(2024, 3, 8, 12, 0, 0)
+    assert spec.previous_elapse(datetime(2024, 3, 8, 7, 0)) == datetime(
+        2024, 3, 7, 17, 59, 50)
+
+    # Stepping through a day of second-level times stays cheap
+    fire = datetime(2024, 3, 8)
+    for _ in range(1000):
+        fire = spec.next_elapse(fire)
+    assert fire == datetime(2024, 3, 8, 10, 46, 30)
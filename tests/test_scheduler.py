@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from kshift.scheduler import Scheduler, next_fire
+from kshift.theme import Theme
+
+
+def test_next_fire_daily():
+    time = datetime(2024, 1, 1, 18, 0)
+
+    assert next_fire(time, datetime(2024, 3, 5, 12,
+                                    0)) == datetime(2024, 3, 5, 18, 0)
+    assert next_fire(time, datetime(2024, 3, 5, 18,
+                                    0)) == datetime(2024, 3, 6, 18, 0)
+
+
+def test_scheduler_fires_latest_due_theme():
+    themes = {
+        "day": Theme(time=["08:00"]),
+        "night": Theme(time=["18:00"]),
+    }
+    scheduler = Scheduler(lambda: themes, None)
+
+    morning = datetime(2024, 3, 5, 7, 0)
+    assert scheduler.advance(themes, morning, False) is None
+    assert scheduler.delay(morning) == 60
+
+    assert scheduler.advance(themes, datetime(2024, 3, 5, 8, 0),
+                             False) == "day"
+    assert scheduler.advance(themes, datetime(2024, 3, 5, 8, 1), False) is None
+
+    # Resuming from suspend the next morning, both themes were missed
+    resumed = datetime(2024, 3, 6, 9, 0)
+    assert scheduler.advance(themes, resumed, True) == "day"
+    assert scheduler.events[0] == (datetime(2024, 3, 6, 18, 0), "night", 0)
+
+
+def test_scheduler_fires_due_theme_across_reload():
+
+    def themes():
+        return {
+            "day": Theme(time=["07:00"]),
+            "night": Theme(time=["20:00"]),
+        }
+
+    scheduler = Scheduler(themes, None)
+    scheduler.advance(themes(), datetime(2024, 3, 5, 19, 0), False)
+    assert scheduler.advance(themes(), datetime(2024, 3, 5, 19, 30),
+                             False) is None
+
+    # Suspended overnight, the config is reloaded on resume
+    assert scheduler.advance(themes(), datetime(2024, 3, 6, 8, 0),
+                             True) == "day"
+    assert scheduler.events[0] == (datetime(2024, 3, 6, 20, 0), "night", 0)
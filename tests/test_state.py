@@ -0,0 +1,81 @@
+import os
+
+from datetime import datetime
+
+from kshift import state
+from kshift.state import (AppliedTheme, DesktopState, last_applied,
+                          record_applied)
+from kshift.theme import Colorscheme, Wallpaper
+
+APPLETSRC = """[Containments][1][Wallpaper][org.kde.image][General]
+Image=file:///home/user/cat.png
+
+[Containments][2][Wallpaper][org.kde.image][General]
+Image=file:///home/user/cat.png
+"""
+
+
+def test_desktop_state(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    (tmp_path / "kdeglobals").write_text(
+        "[General]\nColorScheme=BreezeDark\n\n[Icons]\nTheme=Papirus\n")
+    (tmp_path /
+     "plasma-org.kde.plasma.desktop-appletsrc").write_text(APPLETSRC)
+
+    read = mocker.spy(state.configparser.ConfigParser, "read")
+
+    desktop = DesktopState.read()
+    assert desktop.colorscheme == "BreezeDark"
+    assert desktop.icontheme == "Papirus"
+    assert desktop.wallpapers == {
+        "1": "/home/user/cat.png",
+        "2": "/home/user/cat.png"
+    }
+    assert desktop.wallpaper == "/home/user/cat.png"
+
+    # Each file is parsed once, and again only after it changes
+    parsed = read.call_count
+    DesktopState.read()
+    assert read.call_count == parsed
+
+    os.utime(tmp_path / "kdeglobals", ns=(0, 0))
+    DesktopState.read()
+    assert read.call_count == parsed + 1
+
+
+def test_apply_skips_active(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    (tmp_path / "kdeglobals").write_text("[General]\nColorScheme=BreezeDark\n")
+    (tmp_path /
+     "plasma-org.kde.plasma.desktop-appletsrc").write_text(APPLETSRC)
+    run = mocker.patch("kshift.apply.subprocess.run")
+
+    Colorscheme(val="BreezeDark").apply()
+    Wallpaper(val="/home/user/cat.png").apply()
+    run.assert_not_called()
+
+    Colorscheme(val="BreezeLight").apply()
+    run.assert_called_once()
+    assert run.call_args.args[0] == ["plasma-apply-colorscheme", "BreezeLight"]
+
+
+def test_applied_state_per_source(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    assert last_applied(["systemd"]) is None
+
+    record_applied(
+        AppliedTheme(theme="night",
+                     source="systemd",
+                     time=datetime(2024, 3, 5, 18, 0),
+                     attributes={"colorscheme": "BreezeDark"}))
+    record_applied(
+        AppliedTheme(theme="day",
+                     source="direct",
+                     time=datetime(2024, 3, 5, 19, 0)))
+
+    # A theme applied by hand does not hide the one applied by the timer
+    applied = last_applied(["systemd", "scheduler"])
+    assert applied.theme == "night"
+    assert applied.attributes == {"colorscheme": "BreezeDark"}
+    assert last_applied(["direct", "systemd"]).theme == "day"
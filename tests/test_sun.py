@@ -0,0 +1,156 @@
+import time
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from kshift import sun
+from kshift.sun import SunTable, sun_table_file, sun_times
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_sun_times_match_noaa(utc):
+    # Washington, DC on the solstice: sunrise 05:42 and sunset 20:37 EDT
+    times = sun_times(38.9, -77.04, date(2024, 6, 20))
+
+    assert abs(times.sunrise -
+               datetime(2024, 6, 20, 9, 42)) < timedelta(minutes=2)
+    assert abs(times.sunset -
+               datetime(2024, 6, 21, 0, 37)) < timedelta(minutes=2)
+    assert times.nautical_dawn < times.civil_dawn < times.sunrise
+    assert times.sunset < times.civil_dusk < times.nautical_dusk
+
+
+def test_polar_day_has_no_sunset(utc):
+    times = sun_times(78.2, 15.6, date(2024, 6, 21))
+    assert times.sunrise is None and times.sunset is None
+
+
+def test_config_computes_sun_times(mocker, monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    from kshift.conf import Config
+    from kshift.theme import Theme
+
+    get = mocker.patch("requests.get")
+    config = Config(sun_source="computed",
+                    webdata=False,
+                    latitude=38.9,
+                    longitude=-77.04,
+                    themes={"dusk": Theme(time=["civil_dusk"])})
+
+    get.assert_not_called()
+    assert config.sunrise.time() != datetime.strptime("08:00", "%H:%M").time()
+    assert config.themes["dusk"].time[0] > config.sunset
+
+
+def test_year_table_matches_sun_times(mocker, monkeypatch, tmp_path, utc):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    table = SunTable(38.9, -77.04, 2024)
+    path = sun_table_file(38.9, -77.04, 2024)
+    assert path.stat().st_size == sun.HEADER.size + 366 * sun.RECORD.size
+
+    for day in (date(2024, 1, 1), date(2024, 2, 29), date(2024, 12, 31)):
+        assert table.get(day) == sun_times(38.9, -77.04, day)
+
+    # Reopened from the cache without computing
+    build = mocker.spy(SunTable, "build")
+    assert SunTable(38.9, -77.04,
+                    2024).get(date(2024, 6, 1)) == table.get(date(2024, 6, 1))
+    build.assert_not_called()
+
+    # Tables written by another version are rebuilt
+    path.write_bytes(b"KSUN" + bytes(40))
+    assert SunTable(38.9, -77.04, 2024).get(date(2024, 6, 1)).sunrise
+    build.assert_called_once()
+
+
+def test_sun_data_resolved_once_per_run(mocker, monkeypatch, tmp_path,
+                                        sun_resolver):
+    from kshift.conf import Config
+    from kshift.theme import Theme
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    lookup = mocker.spy(Config, "lookup_sundata")
+
+    def themes():
+        return {
+            "day": Theme(time=["sunrise", "civil_dawn"]),
+            "evening": Theme(time=["sunset"]),
+            "night": Theme(time=["civil_dusk", "nautical_dusk"]),
+        }
+
+    first = Config(sun_source="computed", webdata=False, themes=themes())
+    Config(sun_source="computed", webdata=False, themes=themes())
+    assert sun_resolver.fetches == 1 and lookup.call_count == 1
+
+    # Other locations and explicit invalidation look up again
+    Config(sun_source="computed",
+           webdata=False,
+           latitude=51.5,
+           longitude=0,
+           themes=themes())
+    sun_resolver.invalidate(first.latitude, first.longitude)
+    Config(sun_source="computed", webdata=False, themes=themes())
+    assert sun_resolver.fetches == 3
+
+
+def test_configured_sun_times_kept_without_webdata(monkeypatch, tmp_path):
+    from kshift.conf import Config
+    from kshift.theme import Theme
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    config = Config(webdata=False,
+                    sunrise="06:15",
+                    themes={
+                        "day": Theme(time=["sunrise"]),
+                        "dusk": Theme(time=["civil_dusk"])
+                    })
+
+    assert config.themes["day"].time[0].strftime("%H:%M") == "06:15"
+    assert config.themes["dusk"].time[0] != config.sunset
+
+
+def test_web_data_only_checks_computed_times(mocker, tmp_path, sun_resolver,
+                                             capsys):
+    import json
+
+    from kshift.conf import Config
+    from kshift.theme import Theme
+
+    refresh = mocker.patch.object(Config, "revalidate_sundata")
+
+    def themes():
+        return {"day": Theme(time=["sunrise"])}
+
+    # Nothing cached, the web data is refreshed without waiting for it
+    config = Config(xdg_cache=tmp_path, themes=themes())
+    refresh.assert_called_once()
+    computed = config.sunrise
+
+    # Cached web times far off are warned about but not used
+    today = datetime.now().date()
+    config.api_file.parent.mkdir()
+    config.api_file.write_text(
+        json.dumps({
+            "location": f"{config.latitude},{config.longitude}",
+            "days": {
+                today.isoformat(): {
+                    "sunrise": f"{today}T03:00:00",
+                    "sunset": f"{today}T23:00:00"
+                }
+            }
+        }))
+    sun_resolver.invalidate()
+    config = Config(xdg_cache=tmp_path, themes=themes())
+
+    assert config.sunrise == computed
+    assert "Warning: web sunrise 03:00" in capsys.readouterr().out
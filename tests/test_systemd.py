@@ -0,0 +1,111 @@
+import os
+
+from datetime import datetime
+
+from kshift import systemd
+from kshift.theme import Theme
+
+
+def test_units_written_only_when_changed(tmp_path):
+    templates = systemd.load_templates(tmp_path / "templates")
+    themes = {
+        "day": Theme(time=["08:00"]),
+        "night": Theme(time=["18:00"]),
+        "party": Theme(),
+    }
+
+    changes = systemd.plan_units(
+        systemd.render_units(themes, templates, "kshift"), tmp_path)
+    assert all(change.action == "write" for change in changes)
+    systemd.apply_units(changes, tmp_path)
+
+    assert "OnCalendar=18:00" in (tmp_path / "kshift-night.timer").read_text()
+    assert not (tmp_path / "kshift-party.timer").exists()
+
+    # Nothing changed, nothing to write
+    units = systemd.render_units(themes, templates, "kshift")
+    assert systemd.plan_units(units, tmp_path) == []
+
+    # Only the edited theme's timer is rewritten, the removed one goes away
+    themes["night"] = Theme(time=["19:00"])
+    del themes["party"]
+    changes = systemd.plan_units(
+        systemd.render_units(themes, templates, "kshift"), tmp_path)
+
+    assert [(c.name, c.action) for c in changes] == [
+        ("kshift-day.timer", "write"),
+        ("kshift-night.timer", "write"),
+        ("kshift-party.service", "remove"),
+    ]
+    assert "+OnCalendar=19:00" in changes[1].diff
+
+
+FAKE_SYSTEMCTL = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls"
+cat <<EOF
+Id=kshift-day.timer
+UnitFileState=enabled
+ActiveState=active
+LastTriggerUSec=@1709622000
+NextElapseUSecRealtime=@1709708400
+
+Id=kshift-night.timer
+UnitFileState=disabled
+ActiveState=inactive
+LastTriggerUSec=n/a
+NextElapseUSecRealtime=
+EOF
+"""
+
+
+def test_systemctl_status_in_one_call(tmp_path, monkeypatch):
+    fake = tmp_path / "systemctl"
+    fake.write_text(FAKE_SYSTEMCTL)
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+    timers = systemd.Systemctl().timers(
+        ["kshift-day.timer", "kshift-night.timer"])
+
+    assert timers["kshift-day.timer"].enabled
+    assert timers["kshift-day.timer"].next == datetime.fromtimestamp(
+        1709708400)
+    assert not timers["kshift-night.timer"].enabled
+    assert timers["kshift-night.timer"].last is None
+
+    calls = (tmp_path / "calls").read_text().splitlines()
+    assert len(calls) == 1
+    assert calls[0].startswith("--user show")
+
+
+OLD_SYSTEMCTL = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls"
+case "$*" in *--timestamp*) echo "unknown option" >&2; exit 1;; esac
+cat <<EOF
+Id=kshift-day.timer
+UnitFileState=enabled
+ActiveState=active
+LastTriggerUSec=Tue 2024-03-05 08:00:00 CET
+NextElapseUSecRealtime=Wed 2024-03-06 08:00:00 CET
+EOF
+"""
+
+
+def test_systemctl_before_unix_timestamps(tmp_path, monkeypatch):
+    fake = tmp_path / "systemctl"
+    fake.write_text(OLD_SYSTEMCTL)
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+    systemctl = systemd.Systemctl()
+    assert systemctl.is_enabled("kshift-day.timer")
+
+    timer = systemctl.timers(["kshift-day.timer"])["kshift-day.timer"]
+    assert timer.enabled
+    assert timer.last == datetime(2024, 3, 5, 8, 0)
+    assert timer.next == datetime(2024, 3, 6, 8, 0)
+
+    # Only the timers retry without --timestamp
+    calls = (tmp_path / "calls").read_text().splitlines()
+    assert len(calls) == 3
+    assert "--timestamp" not in calls[0]
@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+from pydantic import ValidationError
+
+from kshift.theme import (ATTRIBUTES, BaseAttribute, Colorscheme, IconTheme,
+                          Theme, discover)
+
+
+def test_discover_fetches_concurrently(mocker):
+    barrier = threading.Barrier(len(ATTRIBUTES), timeout=5)
+
+    def fetcher(name):
+
+        def fetch():
+            # Every fetch must be in flight at once to pass the barrier
+            barrier.wait()
+            return [f"{name}-a", f"{name}-b"], f"{name}-a"
+
+        return fetch
+
+    for name, cls in ATTRIBUTES.items():
+        mocker.patch.object(cls, "fetch_inventory", fetcher(name))
+
+    inventory = discover()
+
+    assert set(inventory) == set(ATTRIBUTES)
+    assert inventory["wallpaper"] == (["wallpaper-a",
+                                       "wallpaper-b"], "wallpaper-a")
+
+
+def test_discover_skips_failed_fetch(mocker):
+    for cls in ATTRIBUTES.values():
+        mocker.patch.object(cls, "fetch_inventory", return_value=([], None))
+    mocker.patch.object(ATTRIBUTES["colorscheme"],
+                        "fetch_inventory",
+                        side_effect=RuntimeError("no plasma"))
+
+    inventory = discover(["colorscheme", "icontheme"])
+
+    assert set(inventory) == {"icontheme"}
+
+
+def test_lazy_theme_fetches_only_on_check(mocker):
+    mocker.patch.object(Colorscheme, "available", [])
+    fetch = mocker.patch.object(Colorscheme,
+                                "fetch_inventory",
+                                return_value=(["BreezeDark"], "BreezeDark"))
+    icons = mocker.patch.object(IconTheme, "fetch_inventory")
+
+    theme = Theme(colorscheme="BreezeDark", time="sunset")
+    fetch.assert_not_called()
+
+    theme.check()
+    fetch.assert_called()
+    icons.assert_not_called()
+
+
+def test_strict_theme_validates_on_build(mocker):
+    mocker.patch.object(BaseAttribute, "strict", True)
+    mocker.patch.object(Colorscheme,
+                        "fetch_inventory",
+                        return_value=(["BreezeDark"], "BreezeDark"))
+
+    with pytest.raises(ValidationError):
+        Theme(colorscheme="Missing")
+
+
+def test_plan_skips_active_attributes(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    (tmp_path / "kdeglobals").write_text("[General]\nColorScheme=BreezeDark\n")
+    mocker.patch("kshift.theme.discover")
+    for cls in ATTRIBUTES.values():
+        mocker.patch.object(cls, "check")
+
+    theme = Theme(colorscheme="BreezeDark",
+                  icontheme="breeze",
+                  cursortheme="Bibata",
+                  command="notify-send night")
+    plan = theme.plan()
+
+    assert [(c.name, c.apply) for c in plan.changes] == [
+        ("colorscheme", False),
+        ("cursortheme", True),
+        ("icontheme", False),
+        ("command", True),
+    ]
+    assert plan.changes[1].reason == "current is breeze_cursors"
+    assert [s.name for s in plan.steps] == ["cursortheme", "command"]
+    assert plan.steps[0].after == []
+    assert plan.steps[1].after == ["cursortheme"]
+
+    # Nothing else to change, the command still runs
+    run = mocker.patch("kshift.apply.subprocess.run")
+    run.return_value.returncode = 0
+    Theme(colorscheme="BreezeDark", command="notify-send night").kshift()
+    run.assert_called_once_with("notify-send night", shell=True, timeout=60)
+
+
+def test_kdeglobals_steps_serialized(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    for cls in ATTRIBUTES.values():
+        mocker.patch.object(cls, "check")
+
+    plan = Theme(colorscheme="BreezeDark",
+                 icontheme="Papirus",
+                 cursortheme="Bibata").plan()
+    after = {step.name: step.after for step in plan.steps}
+
+    # Both tools write kdeglobals, the cursor theme doesn't
+    assert after == {
+        "colorscheme": [],
+        "cursortheme": [],
+        "icontheme": ["colorscheme"],
+    }
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from kshift.theme import Theme
+from kshift.timeline import Timeline
+
+
+def test_timeline_active_and_next_switch():
+    themes = {
+        "day": Theme(time=["08:00"]),
+        "night": Theme(time=["18:00"]),
+        "weekend": Theme(time=["Sat 12:00"]),
+    }
+
+    # Fri 2024-03-08
+    now = datetime(2024, 3, 8, 7, 0)
+    timeline = Timeline.build(themes, now)
+
+    assert timeline.times == sorted(timeline.times)
+    assert timeline.active(now) == "night"
+    assert timeline.next_switch(now) == (datetime(2024, 3, 8, 8, 0), "day")
+
+    saturday = datetime(2024, 3, 9, 13, 0)
+    assert timeline.active(saturday) == "weekend"
+    assert timeline.next_switch(saturday) == (datetime(2024, 3, 9, 18,
+                                                       0), "night")
+
+    # Themes that last fired before the window are still found
+    weekly = Timeline.build({"weekend": themes["weekend"]}, now, days=1)
+    assert weekly.active(now) == "weekend"
+
+
+def test_frequent_times_cover_now():
+    themes = {
+        "a": Theme(time=["*:0/5"]),
+        "b": Theme(time=["08:00"]),
+    }
+
+    now = datetime(2024, 3, 8, 12, 0)
+    timeline = Timeline.build(themes, now)
+
+    assert timeline.last(now) == (now, "a")
+    assert timeline.active(datetime(2024, 3, 8, 11, 57)) == "a"
+
+    # Only the part of the window the capped time fills is covered
+    assert timeline.covers(now)
+    assert not timeline.covers(datetime(2024, 3, 14, 12, 0))